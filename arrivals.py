@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class ArrivalProcess:
+    def __init__(self, rates, turn_probabilities=None, seed=None):
+        # rates: vehicles per second arriving in each direction (independent poisson processes)
+        # turn_probabilities: probability of going straight, left or right after the intersection
+        self.directions = list(rates.keys())
+        self.rates = np.array([rates[direction] for direction in self.directions], dtype=float)
+        self.turns = ["straight", "left", "right"]
+        if turn_probabilities is None:
+            turn_probabilities = {turn: 1 / len(self.turns) for turn in self.turns}
+        self.turn_probabilities = np.array([turn_probabilities[turn] for turn in self.turns], dtype=float)
+        self.rng = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # the same seed always produces the same sequence of arrivals
+        self.rng = np.random.default_rng(seed)
+
+    def arrivals(self, duration):
+        # returns the (direction, turn) of every vehicle arriving within `duration` milliseconds
+        counts = self.rng.poisson(self.rates * duration / 1000)
+        total = int(counts.sum())
+        if total == 0:
+            return []
+
+        turns = self.rng.choice(len(self.turns), size=total, p=self.turn_probabilities)
+        vehicles = []
+        index = 0
+        for direction, count in zip(self.directions, counts):
+            for _ in range(count):
+                vehicles.append((direction, self.turns[turns[index]]))
+                index += 1
+        return vehicles
+
+    def arrivals_batch(self, duration, number_of_intersections):
+        # arrivals of several intersections at once, returned as arrays of
+        # (intersection, direction index, turn index) ordered by intersection and then direction
+        counts = self.rng.poisson(self.rates * duration / 1000, size=(number_of_intersections, len(self.rates)))
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        turns = self.rng.choice(len(self.turns), size=total, p=self.turn_probabilities)
+        flat_counts = counts.ravel()
+        lanes = np.repeat(np.arange(flat_counts.size), flat_counts)
+        return lanes // len(self.rates), lanes % len(self.rates), turns
+
+    def next_arrival(self, index, time):
+        # time (milliseconds) of the next vehicle arriving in direction `index` after `time`, and its turn index
+        # the arrivals of a direction are a poisson process, so the time between two of them is exponential
+        if self.rates[index] <= 0:
+            return float("inf"), None
+        gap = self.rng.exponential(1000 / self.rates[index])
+        return time + gap, int(self.rng.choice(len(self.turns), p=self.turn_probabilities))
@@ -0,0 +1,195 @@
+import argparse
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from sarsa import SARSA
+from state_indexer import StateIndexer
+from traffic_env import TrafficEnv
+
+
+class SharedQTable:
+    def __init__(self, number_of_states, number_of_actions, number_of_workers, name=None):
+        # one Q-table in shared memory that every worker process reads and updates in place
+        # next to it: the number of updates made to the table so far, and per worker
+        # [transitions, summed staleness, largest staleness] for the reporter
+        self.shape = (number_of_states, number_of_actions)
+        self.number_of_workers = number_of_workers
+        table_size = number_of_states * number_of_actions * np.dtype(np.float64).itemsize
+        counters_size = (1 + 3 * number_of_workers) * np.dtype(np.int64).itemsize
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=table_size + counters_size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.q_table = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+        counters = np.ndarray(1 + 3 * number_of_workers, dtype=np.int64, buffer=self.memory.buf, offset=table_size)
+        self.updates = counters[:1]
+        self.worker_statistics = counters[1:].reshape(number_of_workers, 3)
+        if name is None:
+            self.q_table[:] = 0
+            counters[:] = 0
+
+    def close(self):
+        # numpy views have to go before the shared memory can be closed
+        del self.q_table, self.updates, self.worker_statistics
+        self.memory.close()
+
+
+class SharedSARSA(SARSA):
+    def __init__(self, alpha, gamma, epsilon, shared_q_table, worker, state_indexer, locks=None):
+        # SARSA whose Q-table is the shared one, updated without locks (hogwild) unless `locks` is given,
+        # then the row of a state is only updated while holding the lock of its stripe
+        super().__init__(alpha, gamma, epsilon, shared_q_table.shape[0], shared_q_table.shape[1], state_indexer)
+        self.q_table = shared_q_table.q_table
+        self.updates = shared_q_table.updates
+        self.statistics = shared_q_table.worker_statistics[worker]
+        self.locks = locks
+        # number of updates made by the other workers when the last two actions were chosen: the action that
+        # is updated was chosen before the next action, which is chosen right before the update
+        self.previous_chosen_at, self.chosen_at = 0, 0
+
+    def other_updates(self):
+        return int(self.updates[0]) - int(self.statistics[0])
+
+    def choose_action(self, state):
+        self.previous_chosen_at, self.chosen_at = self.chosen_at, self.other_updates()
+        return super().choose_action(state)
+
+    def update(self, state, action, reward, next_state, next_action):
+        # staleness: updates the other workers made between choosing the action and updating it
+        staleness = self.other_updates() - self.previous_chosen_at
+        if self.locks is None:
+            super().update(state, action, reward, next_state, next_action)
+        else:
+            with self.locks[self.row(state) % len(self.locks)]:
+                super().update(state, action, reward, next_state, next_action)
+        # not atomic, a lost increment only makes the reported staleness slightly smaller
+        self.updates[0] += 1
+        self.statistics[0] += 1
+        self.statistics[1] += staleness
+        self.statistics[2] = max(self.statistics[2], staleness)
+
+
+def run_worker(worker, table_name, number_of_workers, locks, stop, seed, alpha, gamma, initial_epsilon,
+               epsilon_decay, min_epsilon, engine):
+    # worker process: its own intersection and exploration, learning into the shared Q-table
+    # every episode of every worker gets its own seed, so no two workers see the same arrivals
+    state_indexer = StateIndexer()
+    shared_q_table = SharedQTable(state_indexer.number_of_states, 4, number_of_workers, name=table_name)
+    try:
+        np.random.seed(seed)
+        agent = SharedSARSA(alpha, gamma, initial_epsilon, shared_q_table, worker, state_indexer, locks)
+        env = TrafficEnv(seed=seed, engine=engine)
+        episode = 0
+        state = env.reset(seed)
+        action = agent.choose_action(state)
+        while not stop.is_set():
+            next_state, reward, done, _ = env.step(action)
+            agent.epsilon = max(min_epsilon, agent.epsilon * epsilon_decay)
+            next_action = agent.choose_action(next_state)
+            agent.update(state, action, reward, next_state, next_action)
+            state, action = next_state, next_action
+            if done:
+                episode += 1
+                state = env.reset(seed + episode * number_of_workers)
+                action = agent.choose_action(state)
+    finally:
+        shared_q_table.close()
+
+
+class AsyncTrain:
+    def __init__(self, workers, transitions, locks=0, seed=0, engine="objects", alpha=0.05, gamma=0.95,
+                 initial_epsilon=0.9, epsilon_decay=0.999756, min_epsilon=0.1, report_seconds=1.0):
+        # `workers` processes train one policy together until `transitions` SARSA updates were made
+        # locks=0 updates the table without locking (hogwild), locks=n stripes the rows over n locks
+        self.workers = workers or multiprocessing.cpu_count()
+        self.transitions = transitions
+        self.locks = locks
+        self.seed, self.engine = seed, engine
+        self.alpha, self.gamma = alpha, gamma
+        self.initial_epsilon, self.epsilon_decay, self.min_epsilon = initial_epsilon, epsilon_decay, min_epsilon
+        self.report_seconds = report_seconds
+        self.state_indexer = StateIndexer()
+        self.q_table = None
+        self.reports = []
+
+    def report(self, statistics, elapsed, previous):
+        # throughput since the last report and over the whole run, and how stale the updates were
+        transitions = int(statistics[:, 0].sum())
+        mean_staleness = statistics[:, 1].sum() / max(transitions, 1)
+        report = {
+            "time": elapsed,
+            "transitions": transitions,
+            "transitions_per_second": (transitions - previous["transitions"]) / (elapsed - previous["time"]),
+            "mean_staleness": mean_staleness,
+            "max_staleness": int(statistics[:, 2].max()),
+            "worker_transitions": statistics[:, 0].tolist(),
+        }
+        self.reports.append(report)
+        print(f"Time: {elapsed:.1f}s | Transitions: {transitions} | "
+              f"Transitions/s: {report['transitions_per_second']:.0f} | Mean staleness: {mean_staleness:.2f} | "
+              f"Max staleness: {report['max_staleness']}")
+        return report
+
+    def train(self):
+        shared_q_table = SharedQTable(self.state_indexer.number_of_states, 4, self.workers)
+        locks = [multiprocessing.Lock() for _ in range(self.locks)] or None
+        stop = multiprocessing.Event()
+        seeds = np.random.SeedSequence(self.seed).generate_state(self.workers)
+        processes = [multiprocessing.Process(target=run_worker, args=(
+            worker, shared_q_table.memory.name, self.workers, locks, stop, int(seeds[worker]), self.alpha,
+            self.gamma, self.initial_epsilon, self.epsilon_decay, self.min_epsilon, self.engine))
+            for worker in range(self.workers)]
+        try:
+            for process in processes:
+                process.start()
+            start = time.perf_counter()
+            previous = {"time": 0.0, "transitions": 0}
+            while True:
+                time.sleep(self.report_seconds)
+                previous = self.report(shared_q_table.worker_statistics.copy(), time.perf_counter() - start,
+                                       previous)
+                if previous["transitions"] >= self.transitions:
+                    break
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError("All workers stopped before the training was done")
+            stop.set()
+            for process in processes:
+                process.join()
+            self.q_table = shared_q_table.q_table.copy()
+            total = self.report(shared_q_table.worker_statistics.copy(), time.perf_counter() - start,
+                                {"time": 0.0, "transitions": 0})
+        finally:
+            stop.set()
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            shared_q_table.close()
+            shared_q_table.memory.unlink()
+        return total
+
+    def save(self, filename):
+        # same format as Train.save_model, one row per reachable state
+        np.save(filename, self.q_table)
+        print(f"Model saved to {filename}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="train one Q-table with several asynchronous worker processes")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--transitions", type=int, default=100000, help="SARSA updates over all workers")
+    parser.add_argument("--locks", type=int, default=0,
+                        help="stripe the Q-table rows over this many locks, 0 updates without locking")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=["objects", "arrays"], default="objects")
+    parser.add_argument("--report-seconds", type=float, default=1.0)
+    parser.add_argument("--save", default=None, help="save the learned Q-table to this file")
+    args = parser.parse_args()
+
+    trainer = AsyncTrain(args.workers, args.transitions, args.locks, args.seed, args.engine,
+                         report_seconds=args.report_seconds)
+    totals = trainer.train()
+    print(f"Workers: {trainer.workers} | Transitions per second: {totals['transitions_per_second']:.0f} | "
+          f"Mean staleness: {totals['mean_staleness']:.2f}")
+    if args.save:
+        trainer.save(args.save)
@@ -0,0 +1,51 @@
+# per-tick cost of Simulation.step against the number of vehicles,
+# with the old car-following scan over the whole vehicle list (before) and the lane queues (after)
+# run from the repository root: python -m benchmarks.leader_lookup
+import time
+from simulation import Simulation
+from vehicle import Vehicle
+
+
+def scan_is_blocked(vehicle, vehicle_list):
+    # the O(n) scan Vehicle.move used to run for every vehicle
+    for other_vehicle in vehicle_list:
+        if other_vehicle.direction == vehicle.direction and other_vehicle.id != vehicle.id:
+            distance = vehicle.get_position() - other_vehicle.get_position()
+            if vehicle.direction in ["west", "north"] and distance < 0 and abs(distance) < vehicle.radius * 3:
+                return True
+            elif vehicle.direction in ["east", "south"] and distance > 0 and abs(distance) < vehicle.radius * 3:
+                return True
+    return False
+
+
+def time_per_tick(vehicle_count, ticks, use_scan, seed=0):
+    simulation = Simulation(seed=seed)
+    lane_is_blocked = Vehicle.is_blocked
+    if use_scan:
+        Vehicle.is_blocked = lambda vehicle: scan_is_blocked(vehicle, simulation.vehicle_list)
+    try:
+        # fill the lanes with heavy traffic, then stop the arrivals and time the queues
+        simulation.arrival_process.rates[:] = 20
+        while len(simulation.vehicle_list) < vehicle_count:
+            simulation.step()
+        simulation.arrival_process.rates[:] = 0
+
+        start = time.perf_counter()
+        for _ in range(ticks):
+            simulation.step()
+        return (time.perf_counter() - start) / ticks, len(simulation.vehicle_list)
+    finally:
+        Vehicle.is_blocked = lane_is_blocked
+
+
+def main():
+    print(f"{'vehicles':>10} {'scan ms/tick':>14} {'lanes ms/tick':>14} {'speedup':>9}")
+    for vehicle_count in [50, 100, 200, 400, 800, 1600]:
+        ticks = 100
+        before, _ = time_per_tick(vehicle_count, ticks, use_scan=True)
+        after, _ = time_per_tick(vehicle_count, ticks, use_scan=False)
+        print(f"{vehicle_count:>10} {before * 1000:>14.3f} {after * 1000:>14.3f} {before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
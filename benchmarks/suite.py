@@ -0,0 +1,227 @@
+# throughput of the simulator and the learner, every benchmark runs with fixed seeds
+# run from the repository root: python -m benchmarks.suite [--quick] [--output benchmarks/results.json]
+# the results file is JSON, compare two of them to see regressions as numbers
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+from checkpoint import Checkpointer
+from event_simulation import EventSimulation
+from main import Main
+from observation import LaneObservation
+from policy import Policy
+from sarsa import SARSA
+from simulation import Simulation
+from state_indexer import StateIndexer
+
+SEED = 0
+
+
+def best_time(function, number, repeat=5):
+    # seconds per call, the best of `repeat` runs of `number` calls
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def filled_simulation(vehicle_count, engine, seed=SEED):
+    # heavy traffic until vehicle_count vehicles are on the road, then no more arrivals
+    simulation = Simulation(seed=seed, engine=engine)
+    simulation.arrival_process.rates[:] = 20
+
+    def alive():
+        return simulation.vehicle_store.count if engine == "arrays" else len(simulation.vehicle_list)
+
+    while alive() < vehicle_count:
+        simulation.step()
+    simulation.arrival_process.rates[:] = 0
+    return simulation, alive
+
+
+def vehicle_movement(results, quick):
+    # cost of moving every vehicle for one frame against the number of vehicles
+    for engine in ["objects", "arrays"]:
+        for vehicle_count in ([100, 400] if quick else [50, 100, 200, 400, 800, 1600]):
+            simulation, alive = filled_simulation(vehicle_count, engine)
+            ticks = 20 if quick else 100
+            start = time.perf_counter()
+            vehicles = 0
+            for _ in range(ticks):
+                vehicles += alive()
+                simulation.step()
+            elapsed = time.perf_counter() - start
+            results.append({"benchmark": "vehicle_movement", "engine": engine, "vehicles": vehicle_count,
+                            "ms_per_tick": 1000 * elapsed / ticks, "us_per_vehicle": 1e6 * elapsed / vehicles})
+
+
+def state_and_reward(results, quick):
+    # latency of the calculations made for every decision
+    for engine in ["objects", "arrays"]:
+        simulation, _ = filled_simulation(400, engine)
+        old_dti, old_count = simulation.calculate_dti(), dict(simulation.vehicle_parameters["vehicle_count"])
+        for _ in range(60):
+            simulation.step()
+        new_dti, new_count = simulation.calculate_dti(), simulation.vehicle_parameters["vehicle_count"]
+        number = 1000 if quick else 10000
+        for name, function in [
+            ("calculate_dti", simulation.calculate_dti),
+            ("calculate_state", simulation.calculate_state),
+            ("calculate_reward", lambda: simulation.calculate_reward(old_dti, new_dti, old_count, new_count)),
+        ]:
+            results.append({"benchmark": name, "engine": engine, "vehicles": 400,
+                            "us_per_call": 1e6 * best_time(function, number)})
+
+
+def lane_observation(results, quick):
+    # states and rewards of a batch of intersections at once, per intersection
+    observation = LaneObservation()
+    rng = np.random.default_rng(SEED)
+    for batch_size in ([1, 1024] if quick else [1, 64, 1024, 8192]):
+        old_dti, new_dti = rng.integers(0, 100000, size=(2, batch_size, 4))
+        old_count, new_count = rng.integers(0, 40, size=(2, batch_size, 4))
+        number = 100 if quick else 1000
+        for name, function in [
+            ("lane_states", lambda: observation.states(new_dti)),
+            ("lane_rewards", lambda: observation.rewards(old_dti, new_dti, old_count, new_count)),
+        ]:
+            results.append({"benchmark": name, "batch_size": batch_size,
+                            "us_per_intersection": 1e6 * best_time(function, number) / batch_size})
+
+
+def event_engine(results, quick):
+    # simulated seconds per second of frame stepping against jumping from event to event
+    seconds = 120 if quick else 1200
+    for engine in ["objects", "arrays", "events"]:
+        if engine == "events":
+            simulation = EventSimulation(seed=SEED)
+            frames = int(seconds * 1000 / simulation.tick_ms)
+            start = time.perf_counter()
+            simulation.run(frames)
+        else:
+            simulation = Simulation(seed=SEED, engine=engine)
+            frames = int(seconds * 1000 / simulation.clock.tick_ms)
+            start = time.perf_counter()
+            for _ in range(frames):
+                simulation.step()
+        elapsed = time.perf_counter() - start
+        results.append({"benchmark": "simulated_time", "engine": engine, "seconds": seconds,
+                        "simulated_seconds_per_second": seconds / elapsed,
+                        "processed_vehicles": sum(simulation.vehicle_parameters["processed_vehicles"].values())})
+
+
+def sarsa(results, quick):
+    state_indexer = StateIndexer()
+    agent = SARSA(alpha=0.05, gamma=0.95, epsilon=0.1, number_of_states=state_indexer.number_of_states,
+                  number_of_actions=4, state_indexer=state_indexer)
+    np.random.seed(SEED)
+    states = np.random.choice(state_indexer.states, size=1024).tolist()
+    actions = np.random.randint(4, size=1024).tolist()
+    number = len(states)
+    iterations = iter(range(10 ** 9))
+
+    def choose_action():
+        agent.choose_action(states[next(iterations) % number])
+
+    def update():
+        i = next(iterations) % number
+        agent.update(states[i], actions[i], 5, states[i - 1], actions[i - 1])
+
+    calls = 2000 if quick else 20000
+    for name, function in [("sarsa_choose_action", choose_action), ("sarsa_update", update)]:
+        results.append({"benchmark": name, "calls_per_second": 1 / best_time(function, calls)})
+
+
+def episode(results, quick):
+    # full training episodes through Main.run, headless and drawn to an off-screen window
+    end_count = 100 if quick else 1000
+    for headless in [True, False]:
+        np.random.seed(SEED)
+        main = Main(headless=headless, realtime=False, seed=SEED)
+        start = time.perf_counter()
+        main.run(1, True, end_count)
+        elapsed = time.perf_counter() - start
+        ticks = main.simulation.clock.tick_count
+        results.append({"benchmark": "episode", "mode": "headless" if headless else "rendered",
+                        "decisions": end_count, "ticks": ticks, "ticks_per_second": ticks / elapsed,
+                        "decisions_per_second": main.decision_count / elapsed})
+    pygame.display.quit()
+
+
+def q_table_io(results, quick):
+    # saving and loading the agent: the Q-table, a legacy full size table, the compiled policy and a checkpoint
+    state_indexer = StateIndexer()
+    rng = np.random.default_rng(SEED)
+    q_table = rng.normal(size=(state_indexer.number_of_states, 4))
+    legacy_q_table = np.zeros((50625, 4))
+    legacy_q_table[state_indexer.states] = q_table
+    number = 20 if quick else 200
+    with tempfile.TemporaryDirectory() as directory:
+        q_table_filename = os.path.join(directory, "q_table.npy")
+        legacy_filename = os.path.join(directory, "legacy_q_table.npy")
+        policy_filename = os.path.join(directory, "policy.npy")
+        np.save(legacy_filename, legacy_q_table)
+        checkpointer = Checkpointer(os.path.join(directory, "checkpoint.npz"),
+                                    lambda: {"q_table": q_table, "epsilon": 0.5,
+                                             "reward_list": rng.normal(size=10000)})
+        snapshot = checkpointer.state()
+        for name, function in [
+            ("q_table_save", lambda: np.save(q_table_filename, q_table)),
+            ("q_table_load", lambda: np.load(q_table_filename)),
+            ("legacy_q_table_load", lambda: state_indexer.compact(np.load(legacy_filename))),
+            ("policy_compile", lambda: Policy.compile(q_table, policy_filename)),
+            ("policy_load_and_act", lambda: Policy(policy_filename).act(3210)),
+            ("checkpoint_write", lambda: checkpointer.write(checkpointer.filename, snapshot)),
+        ]:
+            results.append({"benchmark": name, "ms_per_call": 1000 * best_time(function, number)})
+        checkpointer.close()
+
+
+BENCHMARKS = [vehicle_movement, state_and_reward, lane_observation, event_engine, sarsa, episode, q_table_io]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="simulator and learner benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and iterations")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--only", nargs="+", choices=[benchmark.__name__ for benchmark in BENCHMARKS])
+    args = parser.parse_args()
+
+    results = []
+    for benchmark in BENCHMARKS:
+        if args.only and benchmark.__name__ not in args.only:
+            continue
+        start = len(results)
+        benchmark(results, args.quick)
+        for result in results[start:]:
+            print(", ".join(f"{key}: {value:.4g}" if isinstance(value, float) else f"{key}: {value}"
+                            for key, value in result.items()))
+
+    report = {
+        "seed": SEED,
+        "quick": args.quick,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pygame": pygame.version.ver,
+        "machine": platform.platform(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import pickle
+import queue
+import threading
+import time
+import numpy as np
+
+
+class Checkpointer:
+    def __init__(self, filename, state, every_decisions=1000, every_seconds=None):
+        # save() writes state() to `filename`, the checkpoint training resumes from, training calls it when
+        # a generation is complete
+        # in between, state() is saved every `every_decisions` decisions and/or every `every_seconds` seconds
+        # to salvage_filename, a snapshot of the partly trained agent that is never resumed from
+        # (resuming restarts the generation, which would train the part already in the snapshot twice)
+        # state() only copies what has to be saved, compressing and writing happens in a background thread
+        # so the training loop never waits for the disk
+        if every_decisions is not None and every_decisions <= 0:
+            raise ValueError(f"every_decisions must be positive, got {every_decisions}")
+        self.filename = filename
+        root, extension = os.path.splitext(filename)
+        self.salvage_filename = f"{root}.partial{extension}"
+        self.state = state
+        self.every_decisions = every_decisions
+        self.every_seconds = every_seconds
+        self.decisions = 0
+        self.last_save_time = time.perf_counter()
+
+        # at most one snapshot waits to be written, a newer one replaces it
+        self.pending = queue.Queue(maxsize=1)
+        self.writer = threading.Thread(target=self.write_pending, daemon=True)
+        self.writer.start()
+
+    def decision(self):
+        # called once per decision of the training loop
+        self.decisions += 1
+        due = self.every_decisions is not None and self.decisions % self.every_decisions == 0
+        if self.every_seconds is not None and time.perf_counter() - self.last_save_time >= self.every_seconds:
+            due = True
+        if due:
+            self.save(self.salvage_filename)
+
+    def save(self, filename=None):
+        # a newer snapshot replaces one that is still waiting, so the resumable checkpoint is waited for
+        # until it is on disk, which only happens once per generation
+        self.last_save_time = time.perf_counter()
+        snapshot = (filename or self.filename, self.state())
+        while True:
+            try:
+                self.pending.put_nowait(snapshot)
+                if filename is None:
+                    self.pending.join()
+                return
+            except queue.Full:
+                try:
+                    self.pending.get_nowait()
+                    self.pending.task_done()
+                except queue.Empty:
+                    pass
+
+    def write_pending(self):
+        while True:
+            snapshot = self.pending.get()
+            try:
+                if snapshot is None:
+                    return
+                self.write(*snapshot)
+            except Exception as e:
+                print(f"Error writing checkpoint: {e}")
+            finally:
+                self.pending.task_done()
+
+    def write(self, filename, snapshot):
+        # written next to the checkpoint and renamed over it, a crash never leaves a half written checkpoint
+        directory = os.path.dirname(filename) or "."
+        os.makedirs(directory, exist_ok=True)
+        temporary_filename = f"{filename}.tmp"
+        with open(temporary_filename, "wb") as file:
+            np.savez_compressed(file, **snapshot)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_filename, filename)
+
+    def close(self):
+        # waits until the last snapshot is on disk
+        self.pending.join()
+        self.pending.put(None)
+        self.writer.join()
+
+    @staticmethod
+    def pack(value):
+        # objects that are not arrays (e.g. random generator states) are stored as pickled bytes
+        return np.frombuffer(pickle.dumps(value), dtype=np.uint8)
+
+    @staticmethod
+    def unpack(array):
+        return pickle.loads(array.tobytes())
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            return {key: data[key] for key in data.files}
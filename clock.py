@@ -0,0 +1,36 @@
+import pygame
+
+
+class SimulationClock:
+    def __init__(self, fps=60):
+        # simulated time only moves when tick() is called, each tick is one frame of 1000 / fps milliseconds
+        self.fps = fps
+        self.tick_ms = 1000 / fps
+        self.tick_count = 0
+
+    def get_ticks(self):
+        # same unit as pygame.time.get_ticks (milliseconds)
+        return self.tick_count * self.tick_ms
+
+    def tick(self):
+        self.tick_count += 1
+
+    def reset(self):
+        self.tick_count = 0
+
+
+class WallClock:
+    def __init__(self, fps=None):
+        # real time clock, optionally limiting the loop to `fps` ticks per second
+        self.fps = fps
+        self.pacer = pygame.time.Clock()
+
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def tick(self):
+        if self.fps:
+            self.pacer.tick(self.fps)
+
+    def reset(self):
+        pass
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from event_simulation import EventSimulation
+from policy import Policy
+
+POLICIES = ["greedy", "fixed", "random"]
+# the per-episode results that get a mean and a confidence interval
+METRICS = ["mean_delay", "throughput", "mean_queue", "max_queue", "total_reward", "decisions"]
+# two-sided 95% interval of the normal distribution
+Z_95 = 1.959963984540054
+# the simulation of a worker process, reset for each of its episodes instead of tracing the paths again
+_simulation = None
+
+
+def run_episode(configuration):
+    # one headless, seeded episode of one policy on the event engine, executed in a worker process
+    # greedy looks the state up in the greedy actions of the Q-table, fixed never acts and leaves the
+    # lights on their own cycle, random picks a light at every decision
+    # the reward is the one TrafficEnv gives: the change in congestion between two decisions
+    global _simulation
+    if _simulation is None:
+        _simulation = EventSimulation()
+    simulation = _simulation
+    simulation.reset(configuration["seed"])
+    policy, actions = configuration["policy"], configuration["actions"]
+    rng = np.random.default_rng(configuration["seed"])
+    frames = int(round(configuration["seconds"] * simulation.clock.fps))
+    fps = simulation.clock.fps
+    vehicle_count = simulation.vehicle_parameters["vehicle_count"]
+
+    # queue lengths are sampled once per simulated second
+    queue_samples = []
+    total_reward, decisions = 0, 0
+    old_dti = None
+    next_sample = fps
+    while simulation.frame < frames:
+        target = min(next_sample, frames)
+        if simulation.run(target - simulation.frame, until_decision=True):
+            new_dti = simulation.calculate_dti()
+            if old_dti is not None:
+                total_reward += simulation.calculate_reward(old_dti, new_dti, simulation.old_vehicle_count,
+                                                            vehicle_count)
+            old_dti = new_dti
+            decisions += 1
+            if policy == "greedy":
+                action = actions[simulation.encode_state(new_dti)]
+                if action >= 0:
+                    simulation.apply_action(int(action))
+            elif policy == "random":
+                simulation.apply_action(int(rng.integers(len(simulation.traffic_light_parameters["directions"]))))
+        if simulation.frame >= next_sample:
+            queue_samples.append(sum(vehicle_count.values()))
+            next_sample += fps
+
+    # the vehicles still waiting at the end count with their delay so far, otherwise a policy that never
+    # lets a lane go would look fast
+    delays = np.array(simulation.crossing_delays + simulation.waiting_delays(), dtype=np.float64) / 1000
+    processed = sum(simulation.vehicle_parameters["processed_vehicles"].values())
+    return {
+        "policy": policy,
+        "seed": configuration["seed"],
+        "mean_delay": float(delays.mean()) if len(delays) else 0.0,
+        "throughput": processed * 3600 / configuration["seconds"],
+        "mean_queue": float(np.mean(queue_samples)) if queue_samples else 0.0,
+        "max_queue": float(max(queue_samples, default=0)),
+        "total_reward": float(total_reward),
+        "decisions": decisions,
+        "delays": delays,
+    }
+
+
+class Evaluation:
+    def __init__(self, policies, q_table=None, episodes=200, seconds=300, seed=0, workers=None):
+        # every policy plays the same `episodes` seeded episodes, so the policies are compared on the same
+        # arrivals and the difference of two policies is measured per episode (paired)
+        if "greedy" in policies and q_table is None:
+            raise ValueError("The greedy policy needs a Q-table")
+        for policy in policies:
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown policy: {policy}")
+        self.policies = policies
+        self.actions = Policy.greedy_actions(q_table) if q_table is not None else None
+        self.seeds = [int(seed) for seed in np.random.SeedSequence(seed).generate_state(episodes)]
+        self.seconds = seconds
+        self.workers = workers or os.cpu_count()
+        self.results = {}
+        self.summary = {}
+
+    @staticmethod
+    def confidence_interval(values):
+        # mean of the episodes with the normal 95% interval of the mean
+        values = np.asarray(values, dtype=np.float64)
+        half_width = Z_95 * values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+        return {"mean": float(values.mean()), "low": float(values.mean() - half_width),
+                "high": float(values.mean() + half_width)}
+
+    def summarize(self, episodes):
+        summary = {metric: self.confidence_interval([episode[metric] for episode in episodes])
+                   for metric in METRICS}
+        # percentiles over the delays of every vehicle of every episode
+        delays = np.concatenate([episode["delays"] for episode in episodes])
+        for percentile in [50, 90, 95, 99]:
+            summary[f"p{percentile}_delay"] = float(np.percentile(delays, percentile)) if len(delays) else 0.0
+        summary["vehicles"] = int(len(delays))
+        return summary
+
+    def compare(self, candidate, baseline, metric="mean_delay"):
+        # interval of the per-episode difference candidate - baseline, a negative high end means the
+        # candidate is lower on the metric in a statistically meaningful way
+        return self.confidence_interval([a[metric] - b[metric] for a, b in zip(self.results[candidate],
+                                                                               self.results[baseline])])
+
+    def run(self):
+        configurations = [{"policy": policy, "seed": seed, "seconds": self.seconds,
+                           "actions": self.actions if policy == "greedy" else None}
+                          for policy in self.policies for seed in self.seeds]
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # episodes are short, so they go to the workers in chunks
+            chunksize = max(1, len(configurations) // (4 * self.workers))
+            episodes = list(executor.map(run_episode, configurations, chunksize=chunksize))
+        self.wall_time = time.perf_counter() - start
+        for policy in self.policies:
+            self.results[policy] = [episode for episode in episodes if episode["policy"] == policy]
+            self.summary[policy] = self.summarize(self.results[policy])
+        return self.summary
+
+    def report(self):
+        print(f"Episodes: {len(self.seeds)} x {self.seconds:g}s | Workers: {self.workers} | "
+              f"Time: {self.wall_time:.1f}s")
+        for policy, summary in self.summary.items():
+            print(f"{policy:>6} | " + " | ".join(
+                f"{metric}: {summary[metric]['mean']:.2f} [{summary[metric]['low']:.2f}, "
+                f"{summary[metric]['high']:.2f}]" for metric in ["mean_delay", "throughput", "mean_queue",
+                                                                 "total_reward"]) +
+                  f" | p50/p90/p95 delay: {summary['p50_delay']:.1f}/{summary['p90_delay']:.1f}/"
+                  f"{summary['p95_delay']:.1f}s")
+
+    def save(self, filename):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, "w") as file:
+            json.dump({"episodes": len(self.seeds), "seconds": self.seconds, "seeds": self.seeds,
+                       "summary": self.summary}, file, indent=2)
+        print(f"Evaluation saved to {filename}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="evaluate policies over seeded headless episodes")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=POLICIES)
+    parser.add_argument("--q-table", default="saved_models/sarsa_q_table.npy",
+                        help="Q-table of the greedy policy")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=300, help="simulated time of an episode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="save the summary as JSON to this file")
+    parser.add_argument("--gate", action="store_true",
+                        help="exit with status 1 unless greedy has a lower mean delay than fixed")
+    args = parser.parse_args()
+    if args.gate and not {"greedy", "fixed"} <= set(args.policies):
+        parser.error("--gate compares greedy against fixed, evaluate both")
+
+    q_table = np.load(args.q_table) if "greedy" in args.policies else None
+    evaluation = Evaluation(args.policies, q_table, args.episodes, args.seconds, args.seed, args.workers)
+    evaluation.run()
+    evaluation.report()
+    if args.output:
+        evaluation.save(args.output)
+    if args.gate:
+        difference = evaluation.compare("greedy", "fixed")
+        passed = difference["high"] < 0
+        print(f"Mean delay greedy - fixed: {difference['mean']:.2f}s [{difference['low']:.2f}, "
+              f"{difference['high']:.2f}] | Gate: {'passed' if passed else 'failed'}")
+        raise SystemExit(0 if passed else 1)
@@ -0,0 +1,440 @@
+import argparse
+import heapq
+import itertools
+import math
+import random
+import time
+from arrivals import ArrivalProcess
+from clock import SimulationClock
+from lane_queue import LaneQueues
+from simulation import Simulation
+from traffic_lights import TrafficLights
+from vehicle import Vehicle
+from vehicle_store import TURNS
+
+# the events of one frame are handled in the order of Simulation.step: vehicles arrive, the lights change,
+# the vehicles move (in spawn order) and the vehicles that arrived in the frame are planned after the others
+SPAWN, LIGHTS, MOVE, PLAN = range(4)
+# what a vehicle does at its next event: look at what is in front of it again, cross the stop line, leave the screen
+WAKE, CROSS, EXIT = range(3)
+
+
+class EventVehicle:
+    def __init__(self, direction, turn, rank, frame):
+        # a vehicle of the event engine only knows how far along its path it is: a vehicle moves one pixel
+        # per frame or not at all, so between two of its events it is at k + v * (f - base) at the end of frame f
+        self.direction, self.turn, self.rank = direction, turn, rank
+        self.spawn_frame = frame
+        self.base, self.k, self.v = frame - 1, 0, 0
+        self.crossed = False
+        self.blocked = False
+        # the frame the wait was last counted in, like Vehicle.stop_time
+        self.stop_frame = None
+        self.wait = 0
+        # events scheduled before the last plan of the vehicle are stale
+        self.version = 0
+        self.planned = False
+        self.leader, self.follower = None, None
+
+    def position(self, frame):
+        return self.k + self.v * (frame - self.base)
+
+
+class EventSimulation:
+    def __init__(self, seed=None, arrivals="poisson", layout=None):
+        # the intersection of Simulation (layout, arrival rates, light timings) advanced from event to event
+        # instead of frame by frame: a vehicle arrives, reaches the stop line or the back of the queue,
+        # starts again, crosses the stop line or leaves the screen, the lights change
+        # the frames of these events follow from the rules of Vehicle.move, so the counts, the DTI and the
+        # decisions are the ones of frame stepping: with arrivals="frames" the arrivals are drawn frame by frame
+        # exactly like Simulation draws them and everything matches Simulation with the same seed,
+        # "poisson" draws the time to the next arrival of every lane instead (the same process, no draw per frame)
+        if arrivals not in ["poisson", "frames"]:
+            raise ValueError(f"Unknown arrivals: {arrivals}")
+        self.arrivals = arrivals
+        self.layout = layout if layout is not None else Simulation()
+        layout = self.layout
+        self.traffic_light_parameters = layout.traffic_light_parameters
+        self.vehicle_threshold = layout.vehicle_threshold
+        self.directions = layout.vehicle_parameters["incoming_direction"]
+        # the frame the events were handled up to, the clock shows its time to the traffic lights
+        self.clock = SimulationClock(layout.clock.fps)
+        self.tick_ms = self.clock.tick_ms
+        self.frame = 0
+        # vehicles closer than this to the vehicle in front of them stop (Vehicle.is_blocked)
+        self.block_distance = 3 * layout.vehicle_parameters["radius"]
+        self.trace_paths()
+
+        self.random = random.Random(seed)
+        self.arrival_process = ArrivalProcess(layout.vehicle_parameters["arrival_rates"], seed=seed)
+        self.lane_queues = LaneQueues(self.directions)
+        self.blocked_vehicles = set()
+        self.events = []
+        self.sequence = itertools.count()
+        self.ranks = itertools.count()
+        self.vehicle_parameters = {}
+        self.old_vehicle_count = {}
+        # vehicles that left the screen since the last reset, by the side they left through
+        self.exited = {}
+        # delay (milliseconds) of every vehicle that crossed the stop line since the last reset:
+        # how much longer it took to get there than on an empty road with a green light
+        self.crossing_delays = []
+        self.traffic_lights = None
+        self.phase = None
+        self.lights_version = 0
+        self.arrival_frame = 0
+        self.reset(seed)
+
+    def trace_paths(self):
+        # drives a Vehicle along every (direction, turn) path on green to find, in moves from its spawn point,
+        # where it crosses the stop line, when it leaves the screen and through which side, and how far along
+        # its lane it is after every move, which is the position the vehicle behind it sees
+        layout = self.layout
+        self.stop_lines, self.exits, self.exit_sides, self.lane_distances = {}, {}, {}, {}
+        for direction in self.directions:
+            for turn in TURNS:
+                vehicle = Vehicle(None, layout.vehicle_parameters["radius"], layout.vehicle_parameters["width"],
+                                  layout.vehicle_parameters["speed"], {direction: 0}, {direction: 0}, layout.clock)
+                vehicle.generate_vehicle(layout.vehicle_spawn_coords, self.directions,
+                                         layout.colors["vehicle_direction"], {direction: 0}, direction, turn)
+                start = vehicle.get_position()
+                lane_distance = [0]
+                moves, crossing = 0, None
+                while not vehicle.kill_vehicle(layout.width, layout.height):
+                    vehicle.move(direction, "GREEN", layout.thresholds, layout.vehicle_turning_points,
+                                 {direction: "GREEN"})
+                    moves += 1
+                    lane_distance.append(abs(vehicle.get_position() - start))
+                    if crossing is None and vehicle.crossed_threshold()[0]:
+                        crossing = moves
+                # the vehicle stops at the stop line on red, the first move past it is the crossing
+                self.stop_lines[direction] = crossing - 1
+                self.exits[direction, turn] = moves
+                self.exit_sides[direction, turn] = layout.exit_side(vehicle.x, vehicle.y)
+                self.lane_distances[direction, turn] = lane_distance
+                # the events of a vehicle behind a crossed vehicle assume the crossed vehicle is still
+                # driving along the lane while it is close enough to stop it
+                if lane_distance[:crossing + self.block_distance + 1] != list(range(crossing + self.block_distance
+                                                                                   + 1)):
+                    raise ValueError(f"Turning point of {direction} {turn} is too close to the stop line")
+
+    def reset(self, seed=None):
+        # same as Simulation.reset, resetting with the same seed replays the same episode
+        self.vehicle_parameters = {
+            "vehicle_count": {"north": 0, "south": 0, "east": 0, "west": 0},
+            "processed_vehicles": {"north": 0, "south": 0, "east": 0, "west": 0},
+            "dti_info": {"north": 0, "south": 0, "east": 0, "west": 0},
+        }
+        self.old_vehicle_count = dict(self.vehicle_parameters["vehicle_count"])
+        self.exited = {"north": 0, "east": 0, "south": 0, "west": 0}
+        self.crossing_delays = []
+        self.lane_queues.clear()
+        self.blocked_vehicles.clear()
+        self.events = []
+        self.frame = 0
+        self.clock.reset()
+        if seed is not None:
+            self.random.seed(seed)
+            self.arrival_process.reset(seed)
+
+        layout = self.layout
+        starting_traffic_light = self.random.choice(self.traffic_light_parameters["directions"])
+        self.traffic_lights = TrafficLights(None, starting_traffic_light, "GREEN",
+                                            self.traffic_light_parameters["directions"],
+                                            layout.colors["traffic_lights"], layout.traffic_light_width,
+                                            layout.intersection_center, layout.road_width,
+                                            layout.intersection_trl_width,
+                                            layout.timing_plan(self.vehicle_parameters), self.clock)
+        self.phase = self.traffic_lights.update(0)
+        self.schedule_lights()
+
+        self.arrival_frame = 0
+        if self.arrivals == "frames":
+            self.schedule_frame_arrivals()
+        else:
+            for index in range(len(self.arrival_process.directions)):
+                self.schedule_arrival(index, 0)
+
+    def push(self, frame, kind, order, *payload):
+        heapq.heappush(self.events, (frame, kind, order, next(self.sequence)) + payload)
+
+    def schedule_arrival(self, index, arrival_time):
+        # the next vehicle of a lane, a vehicle arriving at t is spawned in the frame whose tick covers t
+        arrival_time, turn = self.arrival_process.next_arrival(index, arrival_time)
+        if turn is not None:
+            frame = max(1, math.ceil(arrival_time / self.tick_ms))
+            direction = self.arrival_process.directions[index]
+            self.push(frame, SPAWN, index, [(direction, self.arrival_process.turns[turn])], (index, arrival_time))
+
+    def schedule_frame_arrivals(self):
+        # draws the arrivals of the next frames one frame at a time like Simulation.spawn_vehicles,
+        # up to the first frame a vehicle arrives in
+        if not self.arrival_process.rates.any():
+            return
+        while True:
+            self.arrival_frame += 1
+            frame = self.arrival_frame
+            arrivals = self.arrival_process.arrivals(frame * self.tick_ms - (frame - 1) * self.tick_ms)
+            if arrivals:
+                self.push(frame, SPAWN, 0, arrivals, None)
+                return
+
+    def schedule_lights(self):
+        # the first frame in which TrafficLights.update sees that the current phase is over
+        traffic_lights = self.traffic_lights
+        self.lights_version += 1
+        frame = max(self.frame + 1, int(traffic_lights.next_change_time / self.tick_ms) - 1)
+        while frame * self.tick_ms - traffic_lights.last_change_time < traffic_lights.time_limit:
+            frame += 1
+        self.push(frame, LIGHTS, 0, self.lights_version)
+
+    def schedule(self, frame, kind, vehicle):
+        self.push(frame, MOVE, vehicle.rank, vehicle.version, kind, vehicle)
+
+    def spawn_vehicle(self, direction, out_going_direction, frame):
+        vehicle = EventVehicle(direction, out_going_direction, next(self.ranks), frame)
+        self.lane_queues.append(vehicle)
+        self.vehicle_parameters["vehicle_count"][direction] += 1
+        self.push(frame, PLAN, vehicle.rank, vehicle)
+
+    def lane_position(self, vehicle, frame):
+        lane_distance = self.lane_distances[vehicle.direction, vehicle.turn]
+        return lane_distance[min(vehicle.position(frame), len(lane_distance) - 1)]
+
+    def settle(self, vehicle, frame):
+        # counts the wait of a vehicle that was blocked up to the end of `frame`, with the arithmetic of
+        # Vehicle.move: a second is counted whenever a full second passed since the last one
+        tick_ms = self.tick_ms
+        dti_info = self.vehicle_parameters["dti_info"]
+        while True:
+            stop_time = vehicle.stop_frame * tick_ms
+            count_frame = vehicle.stop_frame + int(1000 / tick_ms) - 1
+            while count_frame * tick_ms - stop_time < 1000:
+                count_frame += 1
+            if count_frame > frame:
+                return
+            vehicle.wait += 1
+            dti_info[vehicle.direction] += 1
+            vehicle.stop_frame = count_frame
+
+    def unblock(self, vehicle, frame):
+        if vehicle.blocked:
+            self.settle(vehicle, frame - 1)
+            vehicle.blocked = False
+            vehicle.stop_frame = None
+            self.blocked_vehicles.discard(vehicle)
+
+    def plan(self, vehicle, frame):
+        # decides how the vehicle moves from `frame` on (the rules of Vehicle.move), given where it was at the
+        # end of the frame before and how the vehicle in front of it moves, and schedules its next event
+        k = vehicle.position(frame - 1)
+        direction = vehicle.direction
+        phase = self.phase
+        vehicle.version += 1
+        vehicle.planned = True
+        vehicle.base, vehicle.k = frame - 1, k
+
+        # past the stop line a vehicle only moves while some light is green, until it leaves the screen
+        if vehicle.crossed:
+            vehicle.v = 1 if phase.state == "GREEN" else 0
+            if vehicle.v:
+                self.schedule(frame - 1 + self.exits[direction, vehicle.turn] - k, EXIT, vehicle)
+            return
+
+        # on its own green every vehicle of the lane moves, nothing can block it
+        stop_line = self.stop_lines[direction]
+        if phase.state == "GREEN" and phase.direction == direction:
+            self.unblock(vehicle, frame)
+            vehicle.v = 1
+            self.schedule(frame + stop_line - k, CROSS, vehicle)
+            return
+
+        # on red or yellow it stops behind the vehicle in front of it, or at the stop line
+        leader = vehicle.leader
+        ahead = None
+        blocked = False
+        if leader is not None:
+            ahead = self.lane_position(leader, frame) - k
+            if ahead == 0:
+                # at the same position it goes by what its leader found in front (Vehicle.find_vehicle_in_front)
+                blocked = leader.blocked
+            else:
+                blocked = 0 < ahead < self.block_distance
+
+        if blocked:
+            if not vehicle.blocked:
+                vehicle.blocked = True
+                vehicle.stop_frame = frame
+                self.blocked_vehicles.add(vehicle)
+            vehicle.v = 0
+            # it starts again once the vehicle in front drove far enough away
+            if ahead != 0 and leader.v:
+                self.schedule(frame + self.block_distance - ahead, WAKE, vehicle)
+            return
+
+        self.unblock(vehicle, frame)
+        if k < stop_line:
+            vehicle.v = 1
+            wake = frame + stop_line - k
+            # a vehicle in front that stands still is caught up with, a moving one keeps its distance
+            if leader is not None and ahead > 0 and not leader.v:
+                wake = min(wake, frame + ahead - self.block_distance + 1)
+            self.schedule(wake, WAKE, vehicle)
+        else:
+            vehicle.v = 0
+
+    def replan(self, vehicle, frame):
+        # plans a vehicle again, and the vehicles behind it for as long as what they see in front of them changes
+        while vehicle is not None:
+            before = (vehicle.position(frame), vehicle.v, vehicle.blocked) if vehicle.planned else None
+            self.plan(vehicle, frame)
+            if before == (vehicle.position(frame), vehicle.v, vehicle.blocked):
+                return
+            vehicle = vehicle.follower
+
+    def replan_all(self, frame):
+        for direction in self.directions:
+            for vehicle in self.lane_queues.lane(direction):
+                self.plan(vehicle, frame)
+
+    def handle(self, event):
+        frame, kind = event[0], event[1]
+        if kind == SPAWN:
+            arrivals, lane = event[4], event[5]
+            for direction, out_going_direction in arrivals:
+                self.spawn_vehicle(direction, out_going_direction, frame)
+            if lane is None:
+                self.schedule_frame_arrivals()
+            else:
+                self.schedule_arrival(*lane)
+        elif kind == LIGHTS:
+            if event[4] != self.lights_version:
+                return
+            self.clock.tick_count = frame
+            phase = self.traffic_lights.update(frame * self.tick_ms)
+            if phase is not self.phase:
+                self.phase = phase
+                self.replan_all(frame)
+            self.frame = frame
+            self.schedule_lights()
+        elif kind == MOVE:
+            version, action, vehicle = event[4], event[5], event[6]
+            if version != vehicle.version:
+                return
+            if action == WAKE:
+                self.replan(vehicle, frame)
+            elif action == CROSS:
+                vehicle_parameters = self.vehicle_parameters
+                vehicle.crossed = True
+                vehicle_parameters["vehicle_count"][vehicle.direction] -= 1
+                vehicle_parameters["processed_vehicles"][vehicle.direction] += 1
+                vehicle_parameters["dti_info"][vehicle.direction] -= vehicle.wait
+                vehicle.wait = 0
+                self.crossing_delays.append(
+                    (frame - vehicle.spawn_frame - self.stop_lines[vehicle.direction]) * self.tick_ms)
+                self.schedule(vehicle.base + self.exits[vehicle.direction, vehicle.turn] - vehicle.k, EXIT, vehicle)
+            else:
+                follower = vehicle.follower
+                self.lane_queues.remove(vehicle)
+                vehicle.version += 1
+                self.exited[self.exit_sides[vehicle.direction, vehicle.turn]] += 1
+                if follower is not None:
+                    self.replan(follower, frame)
+        elif kind == PLAN:
+            vehicle = event[4]
+            if not vehicle.planned and vehicle.version == 0:
+                self.replan(vehicle, frame)
+
+    def run(self, frames=None, until_decision=False):
+        # handles every event up to the end of frame self.frame + frames (without an end if frames is None)
+        # with until_decision it stops at the end of the first frame a decision is due in (see should_take_action)
+        # and returns True, old_vehicle_count then holds the counts of the frame before, like Main.run keeps them
+        end = math.inf if frames is None else self.frame + frames
+        events = self.events
+        vehicle_count = self.vehicle_parameters["vehicle_count"]
+        while events and events[0][0] <= end:
+            frame = events[0][0]
+            # nothing happened since the last event, so these are the counts at the end of the frame before
+            self.old_vehicle_count.update(vehicle_count)
+            spawned = False
+            while events and events[0][0] == frame:
+                event = heapq.heappop(events)
+                spawned = spawned or event[1] == SPAWN
+                self.handle(event)
+            self.frame = frame
+            if until_decision and spawned and self.should_take_action():
+                self.clock.tick_count = frame
+                return True
+        if frames is not None:
+            self.frame = end
+        self.clock.tick_count = self.frame
+        return False
+
+    def should_take_action(self):
+        # Simulation.should_take_action: a lane above the vehicle threshold that grew in the last frame
+        vehicle_count = self.vehicle_parameters["vehicle_count"]
+        for direction, count in vehicle_count.items():
+            if count > self.vehicle_threshold and count > self.old_vehicle_count[direction]:
+                return True
+        return False
+
+    def calculate_dti(self):
+        # the blocked vehicles count their wait up to now first
+        for vehicle in self.blocked_vehicles:
+            self.settle(vehicle, self.frame)
+        return {direction: round(total, 2) for direction, total in self.vehicle_parameters["dti_info"].items()}
+
+    def calculate_state(self):
+        return self.encode_state(self.calculate_dti())
+
+    encode_state = staticmethod(Simulation.encode_state)
+
+    def calculate_reward(self, old_dti, new_dti, old_vehicle_count, new_vehicle_count):
+        return self.layout.calculate_reward(old_dti, new_dti, old_vehicle_count, new_vehicle_count)
+
+    def apply_action(self, action):
+        # the light changes at the end of the current frame, the vehicles move on the new phase from the next one
+        self.clock.tick_count = self.frame
+        self.traffic_lights.change_light(self.traffic_light_parameters["directions"][action])
+        self.phase = self.traffic_lights.phase
+        self.replan_all(self.frame + 1)
+        self.schedule_lights()
+
+    def waiting_delays(self):
+        # delay (milliseconds) so far of the vehicles that have not crossed the stop line yet:
+        # the frames since they arrived minus the moves they made
+        return [(self.frame + 1 - vehicle.spawn_frame - vehicle.position(self.frame)) * self.tick_ms
+                for direction in self.directions for vehicle in self.lane_queues.lane(direction)
+                if not vehicle.crossed]
+
+    def vehicles_alive(self):
+        return sum(self.lane_queues.lengths.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="simulate the intersection from event to event")
+    parser.add_argument("--seconds", type=float, default=3600, help="simulated time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", action="store_true",
+                        help="draw the arrivals like Simulation and compare with frame stepping (arrays engine)")
+    args = parser.parse_args()
+
+    event_simulation = EventSimulation(seed=args.seed, arrivals="frames" if args.compare else "poisson")
+    frames = int(args.seconds * 1000 / event_simulation.tick_ms)
+    start = time.perf_counter()
+    event_simulation.run(frames)
+    elapsed = time.perf_counter() - start
+    print(f"Events | Simulated: {args.seconds:.0f}s in {elapsed:.2f}s | "
+          f"Processed: {event_simulation.vehicle_parameters['processed_vehicles']} | "
+          f"DTI: {event_simulation.calculate_dti()} | Vehicle count: {event_simulation.vehicle_parameters['vehicle_count']}")
+
+    if args.compare:
+        simulation = Simulation(seed=args.seed, engine="arrays")
+        start = time.perf_counter()
+        for _ in range(frames):
+            simulation.step()
+        frame_elapsed = time.perf_counter() - start
+        print(f"Frames | Simulated: {args.seconds:.0f}s in {frame_elapsed:.2f}s | "
+              f"Processed: {simulation.vehicle_parameters['processed_vehicles']} | "
+              f"DTI: {simulation.calculate_dti()} | Vehicle count: {simulation.vehicle_parameters['vehicle_count']}")
+        print(f"Speedup: {frame_elapsed / elapsed:.1f}x")
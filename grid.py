@@ -0,0 +1,129 @@
+import argparse
+import time
+import numpy as np
+from simulation import Simulation
+
+# a vehicle leaving an intersection through a side enters the neighbouring intersection on that side
+# as a vehicle coming from the opposite direction: (row offset, column offset, lane it enters)
+NEIGHBOURS = {
+    "north": (-1, 0, "south"),
+    "south": (1, 0, "north"),
+    "west": (0, -1, "east"),
+    "east": (0, 1, "west"),
+}
+
+
+def grid_seeds(seed, number_of_intersections):
+    # (simulation seed, hand over seed) of every intersection, the same whichever process simulates it
+    seeds = np.random.SeedSequence(seed).generate_state(2 * number_of_intersections)
+    return [(int(seeds[2 * i]), int(seeds[2 * i + 1])) for i in range(number_of_intersections)]
+
+
+def neighbour_index(rows, columns, index, side):
+    # index (row major) of the intersection on `side` of intersection `index`, None at the border of the grid
+    row_offset, column_offset, _ = NEIGHBOURS[side]
+    row, column = index // columns + row_offset, index % columns + column_offset
+    if 0 <= row < rows and 0 <= column < columns:
+        return row * columns + column
+    return None
+
+
+class GridSimulation:
+    def __init__(self, rows, columns, seed=None, engine="objects"):
+        # rows x columns intersections with the layout of Simulation, connected edge to edge
+        # every intersection is its own Simulation with its own vehicles (its partition of the network),
+        # so stepping an intersection only touches the vehicles on its approaches
+        # vehicles only arrive from outside on the approaches at the border of the grid,
+        # the inner approaches are fed by the vehicles leaving the neighbouring intersections
+        self.rows, self.columns = rows, columns
+        seeds = grid_seeds(seed, rows * columns)
+        self.intersections = [[Simulation(seed=seeds[row * columns + column][0], engine=engine)
+                               for column in range(columns)] for row in range(rows)]
+        # every intersection draws the turns of the vehicles it hands over with its own generator
+        self.handover_rngs = [np.random.default_rng(handover_seed) for _, handover_seed in seeds]
+        layout = self.intersections[0][0]
+        self.turns = layout.arrival_process.turns
+        self.turn_probabilities = layout.arrival_process.turn_probabilities
+        # vehicles that left the grid
+        self.completed_vehicles = 0
+
+        for row, column, simulation in self:
+            arrival_process = simulation.arrival_process
+            for i, direction in enumerate(arrival_process.directions):
+                if self.neighbour(row, column, direction) is not None:
+                    arrival_process.rates[i] = 0
+
+    def __iter__(self):
+        for row in range(self.rows):
+            for column in range(self.columns):
+                yield row, column, self.intersections[row][column]
+
+    def neighbour(self, row, column, side):
+        index = neighbour_index(self.rows, self.columns, row * self.columns + column, side)
+        if index is None:
+            return None
+        return self.intersections[index // self.columns][index % self.columns]
+
+    def reset(self, seed=None):
+        seeds = grid_seeds(seed, self.rows * self.columns)
+        for row, column, simulation in self:
+            index = row * self.columns + column
+            simulation.reset(seeds[index][0] if seed is not None else None)
+            if seed is not None:
+                self.handover_rngs[index] = np.random.default_rng(seeds[index][1])
+        self.completed_vehicles = 0
+
+    def step(self):
+        # every intersection moves its own vehicles, then the vehicles that drove off an intersection
+        # are handed to the neighbour on that side, where they start at the beginning of the lane next frame
+        for _, _, simulation in self:
+            simulation.step()
+
+        for row, column, simulation in self:
+            for side, count in simulation.exited.items():
+                if count == 0:
+                    continue
+                neighbour = self.neighbour(row, column, side)
+                if neighbour is None:
+                    self.completed_vehicles += count
+                    continue
+                lane = NEIGHBOURS[side][2]
+                # where a vehicle goes at the next intersection is decided when it gets there
+                rng = self.handover_rngs[row * self.columns + column]
+                for turn in rng.choice(len(self.turns), size=count, p=self.turn_probabilities):
+                    neighbour.spawn_vehicle(lane, self.turns[turn])
+
+    def vehicles_alive(self):
+        return sum(len(simulation.vehicle_list) if simulation.vehicle_store is None else simulation.vehicle_store.count
+                   for _, _, simulation in self)
+
+    def processed_vehicles(self):
+        return sum(sum(simulation.vehicle_parameters["processed_vehicles"].values()) for _, _, simulation in self)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="simulate a grid of intersections with fixed light cycles")
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=["objects", "arrays"], default="objects")
+    parser.add_argument("--render", type=int, nargs=2, default=None, metavar=("ROW", "COLUMN"),
+                        help="show one intersection of the grid")
+    args = parser.parse_args()
+
+    grid = GridSimulation(args.rows, args.columns, args.seed, args.engine)
+    if args.render is not None:
+        import pygame
+        from renderer import Renderer
+        pygame.init()
+        shown = grid.intersections[args.render[0]][args.render[1]]
+        shown.add_observer(Renderer(shown, fps=shown.clock.fps))
+
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        grid.step()
+    elapsed = time.perf_counter() - start
+    print(f"Intersections: {args.rows * args.columns} | Steps per second: {args.steps / elapsed:.0f} | "
+          f"Vehicles alive: {grid.vehicles_alive()} | Processed: {grid.processed_vehicles()} | "
+          f"Left the grid: {grid.completed_vehicles}")
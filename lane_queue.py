@@ -0,0 +1,48 @@
+class LaneQueues:
+    def __init__(self, directions):
+        # one queue per lane holding its vehicles in spawn order, which is also their order along the lane:
+        # all vehicles of a lane start at the same point, drive at the same speed and never overtake each other
+        # before the threshold, so sorting by get_position() never reorders a queue
+        # the queues are linked lists through Vehicle.leader / Vehicle.follower,
+        # so spawning, despawning and finding the vehicle in front are all O(1)
+        self.heads = {direction: None for direction in directions}
+        self.tails = {direction: None for direction in directions}
+        self.lengths = {direction: 0 for direction in directions}
+
+    def clear(self):
+        for direction in self.heads:
+            self.heads[direction] = None
+            self.tails[direction] = None
+            self.lengths[direction] = 0
+
+    def append(self, vehicle):
+        # a spawned vehicle joins the back of its lane
+        tail = self.tails[vehicle.direction]
+        vehicle.leader, vehicle.follower = tail, None
+        if tail is None:
+            self.heads[vehicle.direction] = vehicle
+        else:
+            tail.follower = vehicle
+        self.tails[vehicle.direction] = vehicle
+        self.lengths[vehicle.direction] += 1
+
+    def remove(self, vehicle):
+        # a despawned vehicle leaves its lane, the vehicle behind it now follows the one in front of it
+        # crossed vehicles stay in the queue until then because they can still stop the vehicle behind them
+        if vehicle.leader is None:
+            self.heads[vehicle.direction] = vehicle.follower
+        else:
+            vehicle.leader.follower = vehicle.follower
+        if vehicle.follower is None:
+            self.tails[vehicle.direction] = vehicle.leader
+        else:
+            vehicle.follower.leader = vehicle.leader
+        vehicle.leader, vehicle.follower = None, None
+        self.lengths[vehicle.direction] -= 1
+
+    def lane(self, direction):
+        # vehicles of a lane from the front to the back
+        vehicle = self.heads[direction]
+        while vehicle is not None:
+            yield vehicle
+            vehicle = vehicle.follower
@@ -0,0 +1,3 @@
+# the incoming lanes in the order of the per-lane arrays (states, masks, metrics) and the turns a vehicle can take
+DIRECTIONS = ["north", "east", "south", "west"]
+TURNS = ["straight", "left", "right"]
@@ -0,0 +1,116 @@
+import os
+import numpy as np
+
+# one record is written per decision
+METRICS_DTYPE = np.dtype([
+    ("decision", np.int64),
+    ("generation", np.int32),
+    ("time", np.float64),
+    ("reward", np.float64),
+    ("moving_average", np.float64),
+    ("epsilon", np.float64),
+    ("dti", np.float64, 4),
+    ("vehicle_count", np.int64, 4),
+    ("processed_vehicles", np.int64),
+])
+# the lanes of the dti and vehicle_count fields
+METRICS_DIRECTIONS = ["north", "east", "south", "west"]
+METRICS_HEADER = b"METRICS1"
+
+
+class MetricsLog:
+    def __init__(self, filename, chunk_size=1024, window=500, completed_generations=None):
+        # append-only binary log of fixed size records (see METRICS_DTYPE)
+        # records are collected in a buffer of chunk_size records that is written out whenever it is full,
+        # so memory use does not depend on how long training runs
+        # the moving average of the reward over the last `window` decisions is kept up to date on every record
+        # a new run starts an empty log, a resumed run (completed_generations is given) keeps the records of the
+        # generations that completed and drops the ones of the generation that is run again
+        self.filename = filename
+        self.buffer = np.zeros(chunk_size, dtype=METRICS_DTYPE)
+        self.buffered = 0
+        self.decisions = 0
+
+        self.window = np.zeros(window)
+        self.window_sum = 0.0
+        self.window_count = 0
+
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        if completed_generations is None or not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            self.file = open(filename, "wb")
+            self.file.write(METRICS_HEADER)
+            self.file.flush()
+        else:
+            self.resume(completed_generations)
+
+    def resume(self, completed_generations):
+        # generations are logged from 1 and in order, so the records to keep come first
+        records = np.fromfile(self.filename, dtype=METRICS_DTYPE, offset=len(METRICS_HEADER),
+                              count=len(MetricsReader(self.filename)))
+        kept = int(np.argmax(records["generation"] > completed_generations)
+                   if np.any(records["generation"] > completed_generations) else len(records))
+        os.truncate(self.filename, len(METRICS_HEADER) + kept * METRICS_DTYPE.itemsize)
+        self.file = open(self.filename, "ab")
+        # the decision numbers and the moving average continue from the kept records
+        self.decisions = kept
+        for decision in range(max(0, kept - len(self.window)), kept):
+            reward = records["reward"][decision]
+            self.window[decision % len(self.window)] = reward
+            self.window_sum += reward
+            self.window_count += 1
+
+    def moving_average(self, reward):
+        slot = self.decisions % len(self.window)
+        self.window_sum += reward - self.window[slot]
+        self.window[slot] = reward
+        self.window_count = min(self.window_count + 1, len(self.window))
+        return self.window_sum / self.window_count
+
+    def log(self, generation, reward, epsilon, dti, vehicle_count, processed_vehicles, time):
+        # dti, vehicle_count and processed_vehicles are the per-lane dictionaries of the simulation
+        record = self.buffer[self.buffered]
+        record["decision"] = self.decisions
+        record["generation"] = generation if generation is not None else 0
+        record["time"] = time
+        record["reward"] = reward
+        record["moving_average"] = self.moving_average(reward)
+        record["epsilon"] = epsilon
+        record["dti"] = [dti[direction] for direction in METRICS_DIRECTIONS]
+        record["vehicle_count"] = [vehicle_count[direction] for direction in METRICS_DIRECTIONS]
+        record["processed_vehicles"] = sum(processed_vehicles.values())
+        self.decisions += 1
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.file.closed:
+            return
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class MetricsReader:
+    def __init__(self, filename):
+        # reads a MetricsLog lazily through a memory map, also while it is still being written
+        self.filename = filename
+        with open(filename, "rb") as file:
+            if file.read(len(METRICS_HEADER)) != METRICS_HEADER:
+                raise ValueError(f"Not a metrics log: {filename}")
+
+    def __len__(self):
+        # a record that is only partly written yet is not counted
+        return (os.path.getsize(self.filename) - len(METRICS_HEADER)) // METRICS_DTYPE.itemsize
+
+    def records(self):
+        # the records written so far, call again to see newer ones
+        count = len(self)
+        if count == 0:
+            return np.zeros(0, dtype=METRICS_DTYPE)
+        return np.memmap(self.filename, dtype=METRICS_DTYPE, mode="r", offset=len(METRICS_HEADER), shape=(count,))
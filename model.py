@@ -1,36 +1,42 @@
 import numpy as np
 from main import Main
+from policy import Policy
+from state_indexer import StateIndexer
 
 
 class Model:
-    def __init__(self, q_table_filename):
+    def __init__(self, q_table_filename, policy_filename="saved_models/sarsa_policy.npy"):
         self.q_table_filename = q_table_filename
+        self.policy_filename = policy_filename
         self.q_table = None
-        self.best_actions = None
+        self.policy = None
         self.main_instance = Main()
+        self.state_indexer = StateIndexer(self.main_instance.simulation.traffic_light_parameters["directions"])
 
     def load_q_table(self):
         # Load the Q-table from a .npy file.
-        self.q_table = np.load(self.q_table_filename)
+        # older Q-tables have a row for every raw state, only the reachable rows are kept
+        self.q_table = self.state_indexer.compact(np.load(self.q_table_filename))
 
     def determine_best_actions(self):
-        # Determine the best action for each state based on the Q-table.
+        # Compile the best action for each state of the Q-table into a policy file.
         if self.q_table is not None:
-            self.best_actions = np.argmax(self.q_table, axis=1)
+            self.policy = Policy.compile(self.q_table, self.policy_filename,
+                                         self.main_instance.simulation.traffic_light_parameters["directions"])
         else:
             raise ValueError("Q-table not loaded")
 
+    def load_policy(self):
+        # a policy compiled earlier can be used without loading the Q-table
+        self.policy = Policy(self.policy_filename)
+
     def implement_in_simulation(self):
         # Implement the best actions in the simulation environment.
-        # This method needs to be tailored to the specific simulation environment.
-        if self.best_actions is None:
+        # The policy picks the action of the state the simulation is in whenever a decision is due.
+        if self.policy is None:
             raise ValueError("Best actions not determined. Call determine_best_actions() first.")
 
-        action_list = []
-        for state in range(len(self.best_actions)):
-            action_list.append(self.best_actions[state])
-
-        self.main_instance.run(action_list=action_list, training=True)
+        self.main_instance.run(policy=self.policy)
 
 
 # Usage
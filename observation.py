@@ -0,0 +1,54 @@
+import numpy as np
+from vehicle_store import DIRECTIONS
+
+# reward of a lane for the change in its congestion in percent, the first band that matches applies
+# (the bands of Simulation.calculate_reward, a change of exactly -50 is still -20 and one of -25 is -5)
+REWARD_BANDS = [
+    (lambda change: change >= 50, 20),
+    (lambda change: (25 <= change) & (change < 50), 10),
+    (lambda change: (0 <= change) & (change < 25), 5),
+    (lambda change: change <= -50, -20),
+    (lambda change: (-50 <= change) & (change < -25), -10),
+    (lambda change: (-25 <= change) & (change < 0), -5),
+]
+
+
+class LaneObservation:
+    def __init__(self, tie_order=("north", "south", "east", "west")):
+        # state and reward of Simulation calculated on arrays with one column per lane in DIRECTIONS order,
+        # a row per intersection (or a single row for one intersection), with the same results as
+        # Simulation.encode_state and Simulation.calculate_reward
+        # tie_order is the key order of the DTI dict, lanes with the same DTI are ranked in that order
+        self.priority = np.array([list(tie_order).index(direction) for direction in DIRECTIONS])
+        # calculate_state writes the rank of north, east, south and west as the digits of the state
+        self.digits = 10 ** np.arange(len(DIRECTIONS) - 1, -1, -1)
+
+    @staticmethod
+    def congestion(dti, vehicle_count):
+        # DTI per vehicle of every lane, 0 for empty lanes
+        dti, vehicle_count = np.asarray(dti), np.asarray(vehicle_count)
+        return np.where(vehicle_count > 0, dti / np.maximum(vehicle_count, 1), 0)
+
+    def ranks(self, dti):
+        # position of every lane when the lanes are sorted by DTI, highest first:
+        # the lanes with a higher DTI plus the lanes with the same DTI that come first in tie_order
+        dti = np.asarray(dti)
+        other, lane = dti[..., np.newaxis, :], dti[..., :, np.newaxis]
+        ahead = (other > lane) | ((other == lane) & (self.priority[np.newaxis, :] < self.priority[:, np.newaxis]))
+        return ahead.sum(axis=-1)
+
+    def states(self, dti):
+        return self.ranks(dti) @ self.digits
+
+    def lane_rewards(self, old_dti, new_dti, old_vehicle_count, new_vehicle_count):
+        old_congestion = self.congestion(old_dti, old_vehicle_count)
+        new_congestion = self.congestion(new_dti, new_vehicle_count)
+        # same expression as calculate_reward so that the bands see the same floating point values
+        change = np.where(old_congestion > 0,
+                          100 * (old_congestion - new_congestion) / np.where(old_congestion > 0, old_congestion, 1),
+                          0)
+        return np.select([condition(change) for condition, _ in REWARD_BANDS], [reward for _, reward in REWARD_BANDS],
+                         0)
+
+    def rewards(self, old_dti, new_dti, old_vehicle_count, new_vehicle_count):
+        return self.lane_rewards(old_dti, new_dti, old_vehicle_count, new_vehicle_count).sum(axis=-1)
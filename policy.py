@@ -0,0 +1,34 @@
+import os
+import numpy as np
+from state_indexer import StateIndexer
+
+
+class Policy:
+    def __init__(self, filename):
+        # greedy policy compiled from a Q-table: entry `state` of the array is the action to take in that state
+        # (-1 for values calculate_state can never return), so a decision is a single array lookup
+        # the file is memory-mapped, loading it does not read anything until the first decision
+        self.filename = filename
+        self.actions = np.load(filename, mmap_mode="r")
+
+    def act(self, state):
+        if not 0 <= state < len(self.actions) or self.actions[state] < 0:
+            raise ValueError(f"Unreachable state: {state}")
+        return int(self.actions[state])
+
+    @staticmethod
+    def greedy_actions(q_table, directions=("north", "east", "south", "west")):
+        # the argmax of every reachable state of the Q-table, indexed by the raw state
+        state_indexer = StateIndexer(directions)
+        q_table = state_indexer.compact(q_table)
+        actions = np.full(state_indexer.states.max() + 1, -1, dtype=np.int8)
+        actions[state_indexer.states] = np.argmax(q_table, axis=1)
+        return actions
+
+    @staticmethod
+    def compile(q_table, filename, directions=("north", "east", "south", "west")):
+        # writes the greedy actions to a file that Policy loads
+        actions = Policy.greedy_actions(q_table, directions)
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        np.save(filename, actions)
+        return Policy(filename)
@@ -0,0 +1,143 @@
+import cProfile
+import json
+import time
+from contextlib import nullcontext
+
+# returned by Profiler.phase while profiling is off, entering and leaving it does nothing
+NO_PHASE = nullcontext()
+
+
+class Phase:
+    def __init__(self, profiler, name):
+        self.profiler, self.name = profiler, name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Profiler:
+    def __init__(self, enabled=False, max_events=100000):
+        # per phase timings and counters of the simulation loop, switched on and off at runtime
+        # while it is off, phase() hands out the same do-nothing context and count() returns right away
+        # the last max_events phases are also kept as individual events for a chrome://tracing file
+        self.enabled = False
+        self.max_events = max_events
+        self.function_profile = None
+        self.phases = {}
+        self.counters = {}
+        self.gauges = {}
+        self.events = []
+        self.enabled_time = 0
+        self.started = None
+        if enabled:
+            self.enable()
+
+    def enable(self, functions=False):
+        # functions=True also runs cProfile for a function level profile (dump_pstats), which is much slower
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter_ns()
+        if functions:
+            self.function_profile = self.function_profile or cProfile.Profile()
+            self.function_profile.enable()
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.enabled_time += time.perf_counter_ns() - self.started
+        if self.function_profile is not None:
+            self.function_profile.disable()
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def reset(self):
+        self.phases.clear()
+        self.counters.clear()
+        self.gauges.clear()
+        self.events.clear()
+        self.enabled_time = 0
+        if self.enabled:
+            self.started = time.perf_counter_ns()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self, name)
+
+    def record(self, name, start, end):
+        duration = end - start
+        # calls, total and longest duration in nanoseconds
+        stats = self.phases.get(name)
+        if stats is None:
+            self.phases[name] = [1, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            if duration > stats[2]:
+                stats[2] = duration
+        if len(self.events) >= self.max_events:
+            del self.events[:self.max_events // 2]
+        self.events.append((name, start, duration))
+
+    def count(self, name, value=1):
+        # counters add up (e.g. ticks, decisions) and are reported per second
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        # gauges are sampled values (e.g. vehicles alive) and are reported as their mean and maximum
+        if self.enabled:
+            samples = self.gauges.get(name)
+            if samples is None:
+                self.gauges[name] = [1, value, value]
+            else:
+                samples[0] += 1
+                samples[1] += value
+                if value > samples[2]:
+                    samples[2] = value
+
+    def elapsed(self):
+        # seconds spent with profiling switched on
+        elapsed = self.enabled_time
+        if self.enabled:
+            elapsed += time.perf_counter_ns() - self.started
+        return elapsed / 1e9
+
+    def summary(self):
+        elapsed = self.elapsed()
+        lines = [f"{'phase':<20}{'calls':>10}{'total ms':>12}{'mean us':>10}{'max us':>10}{'% time':>8}"]
+        for name, (calls, total, longest) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            share = 100 * total / 1e9 / elapsed if elapsed else 0
+            lines.append(f"{name:<20}{calls:>10}{total / 1e6:>12.1f}{total / calls / 1e3:>10.1f}"
+                         f"{longest / 1e3:>10.1f}{share:>8.1f}")
+        for name, total in self.counters.items():
+            rate = total / elapsed if elapsed else 0
+            lines.append(f"{name}: {total} ({rate:.1f} per second)")
+        for name, (samples, total, largest) in self.gauges.items():
+            lines.append(f"{name}: mean {total / samples:.1f}, max {largest}")
+        return "\n".join(lines)
+
+    def dump_chrome_trace(self, filename):
+        # open the file in chrome://tracing or https://ui.perfetto.dev
+        events = [{"name": name, "ph": "X", "ts": start / 1e3, "dur": duration / 1e3, "pid": 0, "tid": 0}
+                  for name, start, duration in self.events]
+        with open(filename, "w") as file:
+            json.dump({"traceEvents": events}, file)
+
+    def dump_pstats(self, filename):
+        # only available when profiling was enabled with functions=True
+        if self.function_profile is None:
+            raise ValueError("Function profiling was not enabled")
+        self.function_profile.dump_stats(filename)
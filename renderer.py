@@ -0,0 +1,137 @@
+import pygame
+from intersection import Intersection
+from crossing import Crossing
+
+
+class Renderer:
+    def __init__(self, simulation, fps=None):
+        # the renderer observes a simulation and draws it after every step
+        # fps limits the frame rate so that the simulated clock runs at wall-clock speed
+        self.simulation = simulation
+        self.fps = fps
+        self.pacer = pygame.time.Clock()
+        self.screen = pygame.display.set_mode((simulation.width, simulation.height))
+        self.font = pygame.font.SysFont(pygame.font.get_default_font(), 36)
+        self.running = True
+        self.generation = None
+
+        # roads, lanes, labels and crossings never change, they are drawn once to a background surface
+        # every frame only restores the background where something was drawn in the previous frame
+        self.background = pygame.Surface((simulation.width, simulation.height))
+        self.intersection = Intersection(self.background, simulation.intersection_center, simulation.road_width,
+                                         simulation.colors["intersection"], simulation.width, simulation.height,
+                                         self.font)
+        self.crossing = Crossing(self.background, simulation.intersection_center, simulation.road_width,
+                                 simulation.intersection_trl_width, simulation.colors["intersection"])
+        self.intersection.draw()
+        self.crossing.draw()
+
+        # areas drawn in the previous frame, the last light shown and the rendered HUD lines (text, surface, area)
+        self.previous_rects = []
+        self.previous_light = None
+        self.hud = []
+        self.full_redraw = True
+        # functions called when a key is pressed (e.g. the playback controls of replay.py)
+        self.key_handlers = {}
+
+        simulation.set_screen(self.screen)
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            # F3 switches the profiler on and off, its summary is printed when it is switched off
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler = self.simulation.profiler
+                profiler.toggle()
+                if not profiler.enabled:
+                    print(profiler.summary())
+            elif event.type == pygame.KEYDOWN and event.key in self.key_handlers:
+                self.key_handlers[event.key]()
+            # the window content was lost (e.g. it was hidden), everything is drawn again
+            elif event.type in [pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED]:
+                self.full_redraw = True
+
+    def display_data(self, vehicle_count, processed_vehicles, generation):
+        # a line of the HUD is only rendered again when its text changes, returns the areas that changed
+        lines = []
+
+        # display the vehicle count in each lane
+        for k, v in vehicle_count.items():
+            lines.append(f"{k.capitalize()} lane: {v}")
+
+        # display the number of vehicles that have crossed the green light
+        lines.append(None)
+        lines.append(f"Processed Vehicles: {str(sum(processed_vehicles.values()))}")
+
+        # display the generation count
+        if generation is not None:
+            lines.append(f"Generation: {generation}")
+
+        count_x, count_y = 20, 20
+        line_spacing = 25
+        color = (0, 0, 0)
+        changed = []
+        for i, content in enumerate(lines):
+            if i == len(self.hud):
+                self.hud.append((None, None, None))
+            text, surface, rect = self.hud[i]
+            if content != text:
+                if rect is not None:
+                    self.screen.blit(self.background, rect, rect)
+                    changed.append(rect)
+                surface, rect = None, None
+                if content is not None:
+                    surface = self.font.render(content, True, color)
+                    rect = self.screen.blit(surface, (count_x, count_y + i * line_spacing))
+                    changed.append(rect)
+                self.hud[i] = (content, surface, rect)
+        for text, surface, rect in self.hud[len(lines):]:
+            if rect is not None:
+                self.screen.blit(self.background, rect, rect)
+                changed.append(rect)
+        del self.hud[len(lines):]
+        return changed
+
+    def update(self, simulation):
+        profiler = simulation.profiler
+        with profiler.phase("events"):
+            self.handle_events()
+
+        with profiler.phase("draw"):
+            if self.full_redraw:
+                self.screen.blit(self.background, (0, 0))
+                self.hud = []
+            else:
+                # erase the vehicles of the previous frame
+                for rect in self.previous_rects:
+                    self.screen.blit(self.background, rect, rect)
+                # HUD lines that were partly erased with them are drawn again
+                for text, surface, rect in self.hud:
+                    if rect is not None and rect.collidelist(self.previous_rects) != -1:
+                        self.screen.blit(surface, rect)
+
+            # the lights are drawn every frame because vehicles can drive over them,
+            # the screen only has to be updated there when a vehicle did or the light changed
+            light_rects = simulation.traffic_lights.draw()
+            vehicle_rects = simulation.draw_vehicles()
+            dirty_rects = self.previous_rects + vehicle_rects
+            light = (simulation.traffic_lights.current_traffic_light, simulation.traffic_lights.current_light_state)
+            if light != self.previous_light:
+                dirty_rects += light_rects
+                self.previous_light = light
+
+            dirty_rects += self.display_data(simulation.vehicle_parameters["vehicle_count"],
+                                             simulation.vehicle_parameters["processed_vehicles"], self.generation)
+            self.previous_rects = vehicle_rects
+
+        with profiler.phase("flip"):
+            if self.full_redraw:
+                pygame.display.flip()
+                self.full_redraw = False
+            else:
+                pygame.display.update(dirty_rects)
+
+        if self.fps:
+            with profiler.phase("pacing"):
+                self.pacer.tick(self.fps)
@@ -0,0 +1,184 @@
+import argparse
+import os
+import numpy as np
+from vehicle import Vehicle
+from vehicle_store import DIRECTIONS, TURNS
+
+LIGHT_STATES = ["GREEN", "YELLOW", "RED"]
+
+
+class EpisodeRecorder:
+    def __init__(self, generation=None):
+        # observer of a Simulation that records every step in columns, without anything to draw
+        # per frame: time, light, lane counts and processed vehicles; per vehicle and frame: position and turn
+        # the vehicles of frame i are entries frame_offsets[i]:frame_offsets[i + 1] of the vehicle columns
+        self.generation = generation
+        self.frames = {"time": [], "light_direction": [], "light_state": [], "vehicle_count": [],
+                       "processed_vehicles": []}
+        self.vehicles = {"x": [], "y": [], "turn": []}
+        self.frame_offsets = [0]
+        self.decisions = {"frame": [], "state": [], "action": [], "reward": []}
+
+    def update(self, simulation):
+        frames = self.frames
+        traffic_lights = simulation.traffic_lights
+        frames["time"].append(simulation.clock.get_ticks())
+        frames["light_direction"].append(DIRECTIONS.index(traffic_lights.current_traffic_light))
+        frames["light_state"].append(LIGHT_STATES.index(traffic_lights.current_light_state))
+        frames["vehicle_count"].append([simulation.vehicle_parameters["vehicle_count"][d] for d in DIRECTIONS])
+        frames["processed_vehicles"].append(
+            [simulation.vehicle_parameters["processed_vehicles"][d] for d in DIRECTIONS])
+
+        if simulation.vehicle_store is not None:
+            store = simulation.vehicle_store
+            position, turn = store.position[:store.count], store.turn[:store.count]
+            x, y = position[:, 0], position[:, 1]
+        else:
+            vehicles = simulation.vehicle_list
+            x = np.fromiter((vehicle.x for vehicle in vehicles), dtype=float, count=len(vehicles))
+            y = np.fromiter((vehicle.y for vehicle in vehicles), dtype=float, count=len(vehicles))
+            turn = np.fromiter((TURNS.index(vehicle.out_going_direction) for vehicle in vehicles), dtype=np.uint8,
+                               count=len(vehicles))
+        # positions are whole pixels (the vehicles move one pixel per frame from whole pixel spawn points)
+        self.vehicles["x"].append(x.astype(np.int16))
+        self.vehicles["y"].append(y.astype(np.int16))
+        self.vehicles["turn"].append(turn.astype(np.uint8))
+        self.frame_offsets.append(self.frame_offsets[-1] + len(x))
+
+    def decision(self, state, action, reward):
+        # called by Main.run for every decision, after the step it was made in
+        self.decisions["frame"].append(len(self.frames["time"]) - 1)
+        self.decisions["state"].append(state)
+        self.decisions["action"].append(action)
+        self.decisions["reward"].append(reward)
+
+    def save(self, filename):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        columns = {
+            "generation": np.array(-1 if self.generation is None else self.generation),
+            "frame_offsets": np.array(self.frame_offsets, dtype=np.int64),
+            "time": np.array(self.frames["time"], dtype=np.float64),
+            "light_direction": np.array(self.frames["light_direction"], dtype=np.uint8),
+            "light_state": np.array(self.frames["light_state"], dtype=np.uint8),
+            "vehicle_count": np.array(self.frames["vehicle_count"], dtype=np.int32).reshape(-1, len(DIRECTIONS)),
+            "processed_vehicles": np.array(self.frames["processed_vehicles"], dtype=np.int32).reshape(
+                -1, len(DIRECTIONS)),
+            "decision_frame": np.array(self.decisions["frame"], dtype=np.int64),
+            "decision_state": np.array(self.decisions["state"], dtype=np.int64),
+            "decision_action": np.array(self.decisions["action"], dtype=np.int8),
+            "decision_reward": np.array(self.decisions["reward"], dtype=np.float64),
+        }
+        for name, chunks in self.vehicles.items():
+            dtype = np.uint8 if name == "turn" else np.int16
+            columns[name] = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+        np.savez_compressed(filename, **columns)
+
+
+class Playback:
+    def __init__(self, filename, layout):
+        # plays a recorded episode back through the Renderer without simulating anything
+        # it stands in for the Simulation the renderer normally observes, `layout` is a Simulation
+        # that provides the geometry, colors and the traffic lights and vehicle drawing code
+        with np.load(filename) as data:
+            self.episode = {key: data[key] for key in data.files}
+        self.number_of_frames = len(self.episode["time"])
+        self.frame = 0
+        self.speed = 1
+        self.paused = False
+
+        self.layout = layout
+        self.width, self.height = layout.width, layout.height
+        self.intersection_center, self.road_width = layout.intersection_center, layout.road_width
+        self.intersection_trl_width, self.colors = layout.intersection_trl_width, layout.colors
+        self.profiler = layout.profiler
+        self.traffic_lights = layout.traffic_lights
+        self.vehicle_parameters = {"vehicle_count": {}, "processed_vehicles": {}}
+        self.screen = None
+        # a single Vehicle is moved to every recorded position to draw it
+        self.vehicle = Vehicle(None, layout.vehicle_parameters["radius"], layout.vehicle_parameters["width"],
+                               layout.vehicle_parameters["speed"], None, None, layout.clock)
+        self.vehicle_colors = [layout.colors["vehicle_direction"][turn] for turn in TURNS]
+        self.show(0)
+
+    def set_screen(self, screen):
+        self.screen = screen
+        self.traffic_lights.screen = screen
+        self.vehicle.screen = screen
+
+    def show(self, frame):
+        # moves the playback to `frame` (seeking is just picking another frame)
+        episode = self.episode
+        self.frame = min(max(frame, 0), self.number_of_frames - 1)
+        self.traffic_lights.current_traffic_light = DIRECTIONS[episode["light_direction"][self.frame]]
+        self.traffic_lights.current_light_state = LIGHT_STATES[episode["light_state"][self.frame]]
+        # same key order as the simulation, which is the order of the HUD lines
+        for name in ["vehicle_count", "processed_vehicles"]:
+            counts = dict(zip(DIRECTIONS, episode[name][self.frame].tolist()))
+            self.vehicle_parameters[name] = {d: counts[d] for d in self.layout.vehicle_parameters[name]}
+
+    def step(self):
+        # fast-forward skips frames, a speed of 10 shows every 10th frame
+        if not self.paused:
+            self.show(self.frame + self.speed)
+
+    def seek(self, seconds):
+        self.show(self.frame + int(seconds * 1000 / self.layout.clock.tick_ms))
+
+    def next_decision(self):
+        later = self.episode["decision_frame"][self.episode["decision_frame"] > self.frame]
+        if len(later):
+            self.show(int(later[0]))
+            self.paused = True
+
+    def draw_vehicles(self):
+        episode, vehicle = self.episode, self.vehicle
+        start, end = episode["frame_offsets"][self.frame], episode["frame_offsets"][self.frame + 1]
+        rects = []
+        for x, y, turn in zip(episode["x"][start:end].tolist(), episode["y"][start:end].tolist(),
+                              episode["turn"][start:end].tolist()):
+            vehicle.x, vehicle.y, vehicle.color = x, y, self.vehicle_colors[turn]
+            rects.append(vehicle.draw())
+        return rects
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.paused = False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="play back a recorded episode")
+    parser.add_argument("filename")
+    parser.add_argument("--speed", type=int, default=1, help="frames advanced per drawn frame")
+    parser.add_argument("--start", type=float, default=0, help="start at this many seconds")
+    args = parser.parse_args()
+
+    import pygame
+    from renderer import Renderer
+    from simulation import Simulation
+
+    pygame.init()
+    playback = Playback(args.filename, Simulation())
+    renderer = Renderer(playback, fps=60)
+    generation = int(playback.episode["generation"])
+    renderer.generation = generation if generation >= 0 else None
+    # space pauses, left/right seek 10 seconds, 1/2/3 play at 1x, 10x and 100x,
+    # n jumps to the next decision of the agent, home goes back to the start
+    renderer.key_handlers.update({
+        pygame.K_SPACE: playback.toggle_pause,
+        pygame.K_LEFT: lambda: playback.seek(-10),
+        pygame.K_RIGHT: lambda: playback.seek(10),
+        pygame.K_1: lambda: playback.set_speed(1),
+        pygame.K_2: lambda: playback.set_speed(10),
+        pygame.K_3: lambda: playback.set_speed(100),
+        pygame.K_n: playback.next_decision,
+        pygame.K_HOME: lambda: playback.show(0),
+    })
+    playback.speed = args.speed
+    playback.seek(args.start)
+    while renderer.running:
+        renderer.update(playback)
+        playback.step()
+    pygame.quit()
@@ -2,22 +2,32 @@ import numpy as np
 
 
 class SARSA:
-    def __init__(self, alpha, gamma, epsilon, number_of_states, number_of_actions):
+    def __init__(self, alpha, gamma, epsilon, number_of_states, number_of_actions, state_indexer=None):
         self.alpha = alpha
         self.gamma = gamma
         self.epsilon = epsilon
+        # with a state indexer the Q-table only has rows for the reachable states
+        self.state_indexer = state_indexer
+        if state_indexer is not None:
+            number_of_states = state_indexer.number_of_states
         self.number_of_states = number_of_states
         self.number_of_actions = number_of_actions
         self.q_table = np.zeros((self.number_of_states, self.number_of_actions))
 
+    def row(self, state):
+        if self.state_indexer is None:
+            return state
+        return self.state_indexer.index(state)
+
     def choose_action(self, state):
         if np.random.uniform(0, 1) < self.epsilon:
             action = np.random.choice(self.number_of_actions)
         else:
-            action = np.argmax(self.q_table[state, :])
+            action = np.argmax(self.q_table[self.row(state), :])
         return action
 
     def update(self, state, action, reward, next_state, next_action):
+        state, next_state = self.row(state), self.row(next_state)
         predict = self.q_table[state, action]
         target = reward + self.gamma * self.q_table[next_state, next_action]
         self.q_table[state, action] += self.alpha * (target - predict)
@@ -25,3 +35,25 @@ class SARSA:
     def reset(self):
         self.q_table = np.zeros((self.number_of_states, self.number_of_actions))
 
+
+class BatchSARSA(SARSA):
+    def __init__(self, alpha, gamma, epsilon, number_of_states, number_of_actions, state_indexer=None, seed=None):
+        super().__init__(alpha, gamma, epsilon, number_of_states, number_of_actions, state_indexer)
+        self.rng = np.random.default_rng(seed)
+
+    def choose_action_batch(self, states):
+        # epsilon greedy action for every state of the batch
+        rows = self.row(np.asarray(states))
+        greedy = np.argmax(self.q_table[rows], axis=1)
+        explore = self.rng.uniform(0, 1, size=len(rows)) < self.epsilon
+        random_actions = self.rng.integers(self.number_of_actions, size=len(rows))
+        return np.where(explore, random_actions, greedy)
+
+    def update_batch(self, states, actions, rewards, next_states, next_actions):
+        # every transition is evaluated against the Q-table from before the batch,
+        # np.add.at adds the update of every transition, so a state-action pair that appears
+        # several times in the batch gets all of its updates instead of only the last one
+        rows, next_rows = self.row(np.asarray(states)), self.row(np.asarray(next_states))
+        predict = self.q_table[rows, actions]
+        target = rewards + self.gamma * self.q_table[next_rows, next_actions]
+        np.add.at(self.q_table, (rows, actions), self.alpha * (target - predict))
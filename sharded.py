@@ -0,0 +1,207 @@
+import argparse
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from grid import NEIGHBOURS, grid_seeds, neighbour_index
+from simulation import Simulation
+
+LANES = ["north", "east", "south", "west"]
+
+
+class RingBuffers:
+    def __init__(self, number_of_shards, capacity=4096, name=None):
+        # one single-producer single-consumer ring per (source shard, destination shard) in one shared memory block
+        # an entry is (step, destination intersection, lane, turn) of a vehicle handed over to another shard,
+        # head counts the entries written by the source, tail the entries read by the destination
+        self.number_of_shards, self.capacity = number_of_shards, capacity
+        entries_size = number_of_shards * number_of_shards * capacity * 4 * np.dtype(np.int32).itemsize
+        counters_size = number_of_shards * number_of_shards * 2 * np.dtype(np.int64).itemsize
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=entries_size + counters_size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.entries = np.ndarray((number_of_shards, number_of_shards, capacity, 4), dtype=np.int32,
+                                  buffer=self.memory.buf)
+        self.counters = np.ndarray((number_of_shards, number_of_shards, 2), dtype=np.int64, buffer=self.memory.buf,
+                                   offset=entries_size)
+        if name is None:
+            self.counters[:] = 0
+
+    def write(self, source, destination, entries):
+        head, tail = self.counters[source, destination]
+        if head + len(entries) - tail > self.capacity:
+            raise RuntimeError(f"Ring buffer from shard {source} to shard {destination} is full")
+        slots = (head + np.arange(len(entries))) % self.capacity
+        self.entries[source, destination, slots] = entries
+        # the entries are in place before the head moves past them
+        self.counters[source, destination, 0] = head + len(entries)
+
+    def read(self, source, destination, step):
+        # the entries written up to `step`, a source that is already a step ahead may have written more
+        head, tail = self.counters[source, destination]
+        slots = (tail + np.arange(head - tail)) % self.capacity
+        entries = self.entries[source, destination, slots]
+        entries = entries[:np.searchsorted(entries[:, 0], step, side="right")].copy()
+        self.counters[source, destination, 1] = tail + len(entries)
+        return entries[:, 1:]
+
+    def close(self):
+        # numpy views have to go before the shared memory can be closed
+        del self.entries, self.counters
+        self.memory.close()
+
+
+class Shard:
+    def __init__(self, shard, owner, rows, columns, seed, engine):
+        # the intersections of one worker process, simulated exactly like GridSimulation would
+        self.shard, self.owner = shard, owner
+        self.rows, self.columns = rows, columns
+        self.indices = [index for index in range(rows * columns) if owner[index] == shard]
+        seeds = grid_seeds(seed, rows * columns)
+        self.intersections = {index: Simulation(seed=seeds[index][0], engine=engine) for index in self.indices}
+        self.handover_rngs = {index: np.random.default_rng(seeds[index][1]) for index in self.indices}
+        layout = self.intersections[self.indices[0]]
+        self.turns = layout.arrival_process.turns
+        self.turn_probabilities = layout.arrival_process.turn_probabilities
+        self.completed_vehicles = 0
+        for index, simulation in self.intersections.items():
+            arrival_process = simulation.arrival_process
+            for i, direction in enumerate(arrival_process.directions):
+                if neighbour_index(rows, columns, index, direction) is not None:
+                    arrival_process.rates[i] = 0
+
+    def step(self, step, ring_buffers, number_of_shards):
+        # moves the local vehicles and hands over the vehicles that left,
+        # directly to local intersections and through the ring buffers to the other shards
+        for simulation in self.intersections.values():
+            simulation.step()
+
+        outgoing = [[] for _ in range(number_of_shards)]
+        for index, simulation in self.intersections.items():
+            for side, count in simulation.exited.items():
+                if count == 0:
+                    continue
+                neighbour = neighbour_index(self.rows, self.columns, index, side)
+                if neighbour is None:
+                    self.completed_vehicles += count
+                    continue
+                lane = NEIGHBOURS[side][2]
+                turns = self.handover_rngs[index].choice(len(self.turns), size=count, p=self.turn_probabilities)
+                if self.owner[neighbour] == self.shard:
+                    for turn in turns:
+                        self.intersections[neighbour].spawn_vehicle(lane, self.turns[turn])
+                else:
+                    outgoing[self.owner[neighbour]].extend((step, neighbour, LANES.index(lane), turn)
+                                                           for turn in turns)
+        for destination, entries in enumerate(outgoing):
+            if entries:
+                ring_buffers.write(self.shard, destination, np.array(entries, dtype=np.int32))
+
+    def receive(self, step, ring_buffers, number_of_shards):
+        for source in range(number_of_shards):
+            if source == self.shard:
+                continue
+            for neighbour, lane, turn in ring_buffers.read(source, self.shard, step).tolist():
+                self.intersections[neighbour].spawn_vehicle(LANES[lane], self.turns[turn])
+
+    def statistics(self):
+        return {
+            "vehicles_alive": sum(len(simulation.vehicle_list) if simulation.vehicle_store is None
+                                  else simulation.vehicle_store.count for simulation in self.intersections.values()),
+            "processed_vehicles": sum(sum(simulation.vehicle_parameters["processed_vehicles"].values())
+                                      for simulation in self.intersections.values()),
+            "completed_vehicles": self.completed_vehicles,
+        }
+
+
+def run_shard(shard, owner, rows, columns, seed, engine, steps, number_of_shards, ring_name, capacity, barrier,
+              results):
+    # worker process: after every step the shards wait for each other on the barrier, then pick up
+    # the vehicles the other shards handed over to them, which start moving in the next step
+    ring_buffers = RingBuffers(number_of_shards, capacity, name=ring_name)
+    try:
+        state = Shard(shard, owner, rows, columns, seed, engine)
+        barrier.wait()
+        start = time.perf_counter()
+        for step in range(steps):
+            state.step(step, ring_buffers, number_of_shards)
+            barrier.wait()
+            state.receive(step, ring_buffers, number_of_shards)
+        statistics = state.statistics()
+        statistics["wall_time"] = time.perf_counter() - start
+        results.put((shard, statistics))
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        ring_buffers.close()
+
+
+class ShardedGrid:
+    def __init__(self, rows, columns, shards=None, seed=None, engine="objects", capacity=4096):
+        # the intersections of a rows x columns grid split over `shards` worker processes in row major blocks,
+        # so only the vehicles crossing between blocks go through the shared memory ring buffers
+        # the result does not depend on the number of shards, it is the one of GridSimulation
+        self.rows, self.columns = rows, columns
+        self.shards = min(shards or multiprocessing.cpu_count(), rows * columns)
+        self.seed, self.engine, self.capacity = seed, engine, capacity
+        blocks = np.array_split(np.arange(rows * columns), self.shards)
+        self.owner = [0] * (rows * columns)
+        for shard, block in enumerate(blocks):
+            for index in block:
+                self.owner[index] = shard
+
+    def run(self, steps):
+        ring_buffers = RingBuffers(self.shards, self.capacity)
+        barrier = multiprocessing.Barrier(self.shards)
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=run_shard, args=(
+            shard, self.owner, self.rows, self.columns, self.seed, self.engine, steps, self.shards,
+            ring_buffers.memory.name, self.capacity, barrier, results)) for shard in range(self.shards)]
+        try:
+            for worker in workers:
+                worker.start()
+            # a shard that fails aborts the barrier and the others fail with it, none of them puts a result
+            statistics = {}
+            while len(statistics) < len(workers):
+                try:
+                    shard, shard_statistics = results.get(timeout=1)
+                    statistics[shard] = shard_statistics
+                except queue.Empty:
+                    failed = [shard for shard, worker in enumerate(workers) if worker.exitcode not in (None, 0)]
+                    if failed:
+                        raise RuntimeError(f"Shards {failed} failed, see their tracebacks above")
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("All shards stopped without a result")
+            for worker in workers:
+                worker.join()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            ring_buffers.close()
+            ring_buffers.memory.unlink()
+
+        totals = {key: sum(shard[key] for shard in statistics.values())
+                  for key in ["vehicles_alive", "processed_vehicles", "completed_vehicles"]}
+        totals["wall_time"] = max(shard["wall_time"] for shard in statistics.values())
+        return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="simulate a grid of intersections on several processes")
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--shards", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--steps", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", choices=["objects", "arrays"], default="objects")
+    args = parser.parse_args()
+
+    grid = ShardedGrid(args.rows, args.columns, args.shards, args.seed, args.engine)
+    totals = grid.run(args.steps)
+    print(f"Intersections: {args.rows * args.columns} | Shards: {grid.shards} | "
+          f"Steps per second: {args.steps / totals['wall_time']:.0f} | Vehicles alive: {totals['vehicles_alive']} | "
+          f"Processed: {totals['processed_vehicles']} | Left the grid: {totals['completed_vehicles']}")
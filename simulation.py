@@ -0,0 +1,365 @@
+import random
+from arrivals import ArrivalProcess
+from clock import SimulationClock
+from lane_queue import LaneQueues
+from profiler import Profiler
+from traffic_lights import ActuatedTimings, TrafficLights
+from vehicle import Vehicle
+from vehicle_store import VehicleStore, DIRECTIONS
+
+
+class Simulation:
+    def __init__(self, screen=None, clock=None, seed=None, engine="objects", signal_plan="fixed"):
+        # the screen is only set when a renderer is attached, the simulation itself never draws
+        self.screen = screen
+        # simulated time advances by one tick per step, so results do not depend on how fast the machine is
+        self.clock = clock if clock is not None else SimulationClock()
+
+        self.width, self.height = 1000, 800
+        # Intersection parameters and colors
+        # width of the road
+        self.road_width = 150
+        # width of the traffic light
+        self.traffic_light_width = self.road_width // 2
+        # center of the intersection
+        self.intersection_center = (self.width // 2, self.height // 2)
+        # distance from the center of the intersection to the center of the traffic light
+        self.intersection_trl_width = self.road_width // 5
+
+        self.colors = {
+            "intersection": {
+                "BLACK": (0, 0, 0),
+                "GREEN": (26, 93, 26),
+                "RED": (255, 0, 0),
+                "YELLOW": (255, 255, 0),
+                "GRAY": (128, 128, 128),
+                "WHITE": (255, 255, 255),
+                "BROWN": (185, 148, 112)
+            },
+            "traffic_lights": {
+                "YELLOW_TR": (255, 255, 0),
+                "GREEN_TR": (78, 228, 78),
+                "RED_TR": (255, 0, 0)
+            },
+            "vehicle_direction": {
+                "straight": (255, 163, 60),
+                "left": (135, 196, 255),
+                "right": (255, 75, 145)
+            }
+        }
+
+        self.vehicle_parameters = {
+            "radius": 12,
+            "width": 12,
+            "gap": 12,
+            "speed": 1,
+
+            "incoming_direction": ["north", "east", "south", "west"],
+            # vehicles per second arriving in each lane, about one vehicle every 0.3 seconds in total
+            "arrival_rates": {"north": 0.83, "east": 0.83, "south": 0.83, "west": 0.83},
+            "vehicle_count": {"north": 0, "south": 0, "east": 0, "west": 0},
+            "processed_vehicles": {"north": 0, "south": 0, "east": 0, "west": 0},
+            "dti_info": {"north": 0, "south": 0, "east": 0, "west": 0}
+        }
+
+        self.traffic_light_parameters = {
+            "directions": ["north", "east", "south", "west"],
+            "timings": {
+                "RED": 10,
+                "GREEN": 10,
+                "YELLOW": 2
+            },
+            # with the actuated signal plan the green is extended by green_extension seconds at a time while
+            # vehicles wait in the green lane, up to max_green seconds
+            "max_green": 30,
+            "green_extension": 2
+        }
+        # "fixed" cycles the lights on the timings, "actuated" extends the greens as long as there is demand
+        if signal_plan not in ["fixed", "actuated"]:
+            raise ValueError(f"Unknown signal plan: {signal_plan}")
+        self.signal_plan = signal_plan
+
+        self.thresholds = {
+            "west": self.intersection_center[0] - self.road_width // 2 - self.intersection_trl_width - 30,
+            "east": self.intersection_center[
+                        0] - self.road_width // 2 + self.road_width + self.intersection_trl_width + 30,
+            "north": self.intersection_center[1] - self.road_width // 2 - self.intersection_trl_width - 30,
+            "south": self.intersection_center[1] + self.road_width - 15
+        }
+
+        self.vehicle_spawn_coords = {
+            "west": [0, self.intersection_center[1] + self.road_width // 4],
+            "east": [2 * self.intersection_center[0], self.intersection_center[1] - self.road_width // 4],
+            "north": [self.intersection_center[0] - self.road_width // 4, 0],
+            "south": [self.intersection_center[0] + self.road_width // 4, 2 * self.intersection_center[1]]
+        }
+
+        self.vehicle_turning_points = {
+            "left": {
+                "west": self.intersection_center[0] + self.road_width // 4,
+                "north": self.intersection_center[1] + self.road_width // 4,
+                "east": self.intersection_center[0] - self.road_width // 4,
+                "south": self.intersection_center[1] - self.road_width // 4
+            },
+            "right": {
+                "west": self.intersection_center[0] - self.road_width // 4,
+                "north": self.intersection_center[1] - self.road_width // 4,
+                "east": self.intersection_center[0] + self.road_width // 4,
+                "south": self.intersection_center[1] + self.road_width // 4
+            }
+        }
+
+        # the maximum number of vehicles in each lane
+        self.vehicle_threshold = 10
+
+        # "objects" moves one Vehicle object at a time, "arrays" moves every vehicle at once with a VehicleStore
+        self.engine = engine
+        self.vehicle_list = []
+        self.lane_queues = LaneQueues(self.vehicle_parameters["incoming_direction"])
+        self.vehicle_store = None
+        if engine == "arrays":
+            self.vehicle_store = VehicleStore(self.vehicle_parameters["radius"], self.vehicle_parameters["width"],
+                                              self.vehicle_parameters["speed"], self.thresholds,
+                                              self.vehicle_turning_points, self.vehicle_spawn_coords,
+                                              self.colors["vehicle_direction"], self.width, self.height, self.clock)
+        elif engine != "objects":
+            raise ValueError(f"Unknown simulation engine: {engine}")
+
+        # vehicles are spawned inside the step loop by a seeded arrival process
+        self.random = random.Random(seed)
+        self.arrival_process = ArrivalProcess(self.vehicle_parameters["arrival_rates"], seed=seed)
+
+        # observers (e.g. the pygame renderer) are notified after every step
+        self.observers = []
+        # per phase timings of the step loop, shared with the renderer and Main.run, off unless enabled
+        self.profiler = Profiler()
+        # vehicles that drove off the screen during the last step, by the side they left through (see grid.py)
+        self.exited = {"north": 0, "east": 0, "south": 0, "west": 0}
+
+        self.starting_traffic_light = None
+        self.traffic_lights = None
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # clear all vehicles and reset the lane counters
+        # resetting with the same seed replays the same episode
+        self.vehicle_list.clear()
+        self.lane_queues.clear()
+        if self.vehicle_store is not None:
+            self.vehicle_store.clear()
+        self.vehicle_parameters["vehicle_count"] = {"north": 0, "south": 0, "east": 0, "west": 0}
+        self.vehicle_parameters["processed_vehicles"] = {"north": 0, "south": 0, "east": 0, "west": 0}
+        self.vehicle_parameters["dti_info"] = {"north": 0, "south": 0, "east": 0, "west": 0}
+
+        self.clock.reset()
+        if seed is not None:
+            self.random.seed(seed)
+            self.arrival_process.reset(seed)
+        self.starting_traffic_light = self.random.choice(self.traffic_light_parameters["directions"])
+        self.traffic_lights = TrafficLights(self.screen, self.starting_traffic_light, "GREEN",
+                                            self.traffic_light_parameters["directions"], self.colors["traffic_lights"],
+                                            self.traffic_light_width,
+                                            self.intersection_center, self.road_width, self.intersection_trl_width,
+                                            self.timing_plan(self.vehicle_parameters), self.clock)
+
+    def timing_plan(self, vehicle_parameters):
+        # the timings TrafficLights runs on, an actuated plan reads the demand from the vehicle counts
+        # of vehicle_parameters when a green is about to end
+        timings = self.traffic_light_parameters["timings"]
+        if self.signal_plan == "fixed":
+            return timings
+        return ActuatedTimings(timings, lambda direction: vehicle_parameters["vehicle_count"][direction],
+                               self.traffic_light_parameters["max_green"],
+                               self.traffic_light_parameters["green_extension"])
+
+    def set_screen(self, screen):
+        # used by the renderer to give the drawable objects a surface to draw on
+        self.screen = screen
+        self.traffic_lights.screen = screen
+        for vehicle in self.vehicle_list:
+            vehicle.screen = screen
+
+    def add_observer(self, observer):
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def spawn_vehicles(self, duration):
+        # spawn the vehicles that arrived during the last `duration` milliseconds
+        for direction, out_going_direction in self.arrival_process.arrivals(duration):
+            self.spawn_vehicle(direction, out_going_direction)
+
+    def spawn_vehicle(self, direction, out_going_direction):
+        # a new vehicle at the start of the `direction` lane (also used by grid.py for vehicles handed over)
+        if self.vehicle_store is not None:
+            self.vehicle_store.spawn(direction, out_going_direction)
+            self.vehicle_parameters["vehicle_count"][direction] += 1
+            return
+        vehicle = Vehicle(self.screen, self.vehicle_parameters["radius"], self.vehicle_parameters["width"],
+                          self.vehicle_parameters["speed"],
+                          self.vehicle_parameters["processed_vehicles"], self.vehicle_parameters["dti_info"],
+                          self.clock)
+        vehicle.generate_vehicle(self.vehicle_spawn_coords, self.vehicle_parameters["incoming_direction"],
+                                 self.colors["vehicle_direction"], self.vehicle_parameters["vehicle_count"],
+                                 direction, out_going_direction)
+        self.vehicle_list.append(vehicle)
+        self.lane_queues.append(vehicle)
+
+    def step(self):
+        # advance the clock, the lights and every vehicle by one frame, nothing is drawn here
+        profiler = self.profiler
+        for side in self.exited:
+            self.exited[side] = 0
+        previous_time = self.clock.get_ticks()
+        self.clock.tick()
+        current_time = self.clock.get_ticks()
+        with profiler.phase("spawn"):
+            self.spawn_vehicles(current_time - previous_time)
+
+        with profiler.phase("traffic_lights"):
+            phase = self.traffic_lights.update(current_time)
+
+        with profiler.phase("movement"):
+            if self.vehicle_store is not None:
+                self.move_vehicle_store(phase)
+            else:
+                self.move_vehicle_list(phase)
+
+        if profiler.enabled:
+            profiler.count("ticks")
+            profiler.gauge("vehicles alive",
+                           self.vehicle_store.count if self.vehicle_store is not None else len(self.vehicle_list))
+
+        for observer in self.observers:
+            observer.update(self)
+
+    def move_vehicle_list(self, phase):
+        # iterate over a copy so that removing a vehicle does not skip the next one
+        for vehicle in list(self.vehicle_list):
+            vehicle.move(phase.direction, phase.state, self.thresholds, self.vehicle_turning_points, phase.colors)
+            if vehicle.kill_vehicle(self.width, self.height):
+                self.vehicle_list.remove(vehicle)
+                self.lane_queues.remove(vehicle)
+                self.exited[self.exit_side(vehicle.x, vehicle.y)] += 1
+
+            has_crossed, crossed_direction = vehicle.crossed_threshold()
+            if has_crossed:
+                self.vehicle_parameters["vehicle_count"][crossed_direction] -= 1
+
+    def move_vehicle_store(self, phase):
+        # the light masks come precomputed with the phase
+        self.vehicle_store.move_batch(phase.go_condition, phase.light_is_red, phase.red_or_yellow)
+        for x, y in self.vehicle_store.kill_vehicles().tolist():
+            self.exited[self.exit_side(x, y)] += 1
+        crossed = self.vehicle_store.crossed_threshold()[0]
+        for direction, count in zip(DIRECTIONS, crossed):
+            self.vehicle_parameters["vehicle_count"][direction] -= int(count)
+            self.vehicle_parameters["processed_vehicles"][direction] += int(count)
+
+    def exit_side(self, x, y):
+        # the side of the screen a vehicle at (x, y) left through
+        if x < 0:
+            return "west"
+        if x > self.width:
+            return "east"
+        if y < 0:
+            return "north"
+        return "south"
+
+    def draw_vehicles(self):
+        # returns the areas of the screen that were drawn
+        if self.vehicle_store is not None:
+            return self.vehicle_store.draw(self.screen)
+        return [vehicle.draw() for vehicle in self.vehicle_list]
+
+    @staticmethod
+    def calculate_avg_congestion(dti, vehicle_count):
+        return {direction: (dti[direction] / vehicle_count[direction] if vehicle_count[direction] > 0 else 0)
+                for direction in dti.keys()}
+
+    def calculate_reward(self, old_dti, new_dti, old_vehicle_count, new_vehicle_count):
+        old_congestion = self.calculate_avg_congestion(old_dti, old_vehicle_count)
+        new_congestion = self.calculate_avg_congestion(new_dti, new_vehicle_count)
+
+        # Calculate rewards for each lane
+        lane_rewards = {"north": 0, "south": 0, "east": 0, "west": 0}
+        for lane in ["north", "south", "east", "west"]:
+            # calculating congestion change percentage
+            if old_congestion[lane] > 0:
+                congestion_change = 100 * (old_congestion[lane] - new_congestion[lane]) / old_congestion[
+                    lane]
+            else:
+                congestion_change = 0
+
+            if congestion_change >= 50:
+                lane_rewards[lane] += 20
+            elif 25 <= congestion_change < 50:
+                lane_rewards[lane] += 10
+            elif 0 <= congestion_change < 25:
+                lane_rewards[lane] += 5
+            elif congestion_change <= -50:
+                lane_rewards[lane] -= 20
+            elif -50 <= congestion_change < -25:
+                lane_rewards[lane] -= 10
+            elif -25 <= congestion_change < 0:
+                lane_rewards[lane] -= 5
+
+        return sum(lane_rewards.values())
+
+    def calculate_dti(self):
+        if self.vehicle_store is not None:
+            totals = dict(zip(DIRECTIONS, self.vehicle_store.calculate_dti()[0]))
+            return {direction: round(int(totals[direction]), 2) for direction in self.vehicle_parameters["dti_info"]}
+
+        # the vehicles keep a running total per lane, so this does not depend on how many are queued
+        return {direction: round(total, 2) for direction, total in self.vehicle_parameters["dti_info"].items()}
+
+    def calculate_state(self):
+        return self.encode_state(self.calculate_dti())
+
+    @staticmethod
+    def encode_state(dti_values):
+        # Sort directions based on DTI values
+        sorted_directions = sorted(dti_values, key=dti_values.get, reverse=True)
+        # Encode the sorted directions into state
+        state = [str(sorted_directions.index(direction)) for direction in ["north", "east", "south", "west"]]
+        # Convert to integer state
+        return int(''.join(state))
+
+    @staticmethod
+    def calculate_traffic_trend(current_counts, previous_counts):
+        trend = {}
+        for direction in current_counts:
+            if current_counts[direction] > previous_counts[direction]:
+                trend[direction] = 'increasing'
+            elif current_counts[direction] < previous_counts[direction]:
+                trend[direction] = 'decreasing'
+            else:
+                trend[direction] = 'stable'
+        return trend
+
+    @staticmethod
+    def predict_future_traffic(current_trend):
+        prediction = {}
+        for direction, trend in current_trend.items():
+            if trend == 'increasing':
+                prediction[direction] = 'likely to increase'
+            elif trend == 'decreasing':
+                prediction[direction] = 'likely to decrease'
+            else:
+                prediction[direction] = 'likely to remain stable'
+        return prediction
+
+    def should_take_action(self, predictions):
+        for direction, prediction in predictions.items():
+            if prediction == 'likely to increase' and self.vehicle_parameters["vehicle_count"][
+                direction] > self.vehicle_threshold:
+                return True
+        return False
+
+    def apply_action(self, action):
+        directions = ["north", "east", "south", "west"]
+        chosen_direction = directions[action]
+        self.traffic_lights.change_light(chosen_direction)
@@ -0,0 +1,33 @@
+import itertools
+import numpy as np
+
+
+class StateIndexer:
+    def __init__(self, directions=("north", "east", "south", "west")):
+        # calculate_state writes the DTI rank of every lane as one digit, so the only states it can
+        # return are the permutations of the ranks (24 for four lanes, the largest being 3210)
+        # every reachable state gets a dense index, which is its row in the Q-table
+        self.states = np.array(sorted(int(''.join(str(rank) for rank in ranks))
+                                      for ranks in itertools.permutations(range(len(directions)))))
+        self.number_of_states = len(self.states)
+        self.lookup = np.full(self.states.max() + 1, -1, dtype=np.int64)
+        self.lookup[self.states] = np.arange(self.number_of_states)
+
+    def index(self, state):
+        # works on a single state or an array of states
+        state = np.asarray(state)
+        if np.any(state < 0) or np.any(state >= len(self.lookup)) or np.any(self.lookup[state] < 0):
+            raise ValueError(f"Unreachable state: {state}")
+        index = self.lookup[state]
+        return int(index) if index.ndim == 0 else index
+
+    def state(self, index):
+        return self.states[index]
+
+    def compact(self, q_table):
+        # keep only the rows of the reachable states of a Q-table indexed by the raw state
+        if len(q_table) == self.number_of_states:
+            return q_table
+        if len(q_table) <= self.states.max():
+            raise ValueError(f"Q-table with {len(q_table)} rows does not cover the state space")
+        return q_table[self.states].copy()
@@ -0,0 +1,91 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+def run_configuration(configuration):
+    # one headless, seeded training run, executed in a worker process
+    # pygame and the simulation are imported here so that every worker sets them up for itself
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from main import Main
+
+    seed = configuration["seed"]
+    # SARSA explores with the global numpy generator
+    np.random.seed(seed)
+    main = Main(headless=True, seed=seed, engine=configuration["engine"], alpha=configuration["alpha"],
+                gamma=configuration["gamma"], initial_epsilon=configuration["initial_epsilon"],
+                epsilon_decay=configuration["epsilon_decay"], min_epsilon=configuration["min_epsilon"])
+
+    start = time.perf_counter()
+    total_reward = main.run(1, True, configuration["end_count"])
+    wall_time = time.perf_counter() - start
+
+    return {
+        **configuration,
+        "total_reward": float(total_reward),
+        "wall_time": wall_time,
+        "q_table": main.sarsa_agent.q_table,
+        "reward_list": np.array(main.reward_list),
+    }
+
+
+class Sweep:
+    def __init__(self, alphas, gammas, epsilon_schedules, seeds, end_count, engine="arrays", workers=None):
+        # every combination of alpha, gamma, epsilon schedule and seed is trained in its own process
+        # an epsilon schedule is (initial_epsilon, epsilon_decay, min_epsilon)
+        self.configurations = [
+            {"alpha": alpha, "gamma": gamma, "initial_epsilon": initial_epsilon, "epsilon_decay": epsilon_decay,
+             "min_epsilon": min_epsilon, "seed": seed, "end_count": end_count, "engine": engine}
+            for alpha, gamma, (initial_epsilon, epsilon_decay, min_epsilon), seed
+            in itertools.product(alphas, gammas, epsilon_schedules, seeds)]
+        self.workers = workers or os.cpu_count()
+        self.results = []
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(run_configuration, configuration) for configuration in self.configurations]
+            for future in as_completed(futures):
+                result = future.result()
+                self.results.append(result)
+                print(f"alpha: {result['alpha']} | gamma: {result['gamma']} | seed: {result['seed']} | "
+                      f"Reward: {result['total_reward']} | Time: {result['wall_time']:.1f}s")
+        # same order as the grid, whatever order the runs finished in
+        self.results.sort(key=lambda result: self.configurations.index(
+            {key: result[key] for key in self.configurations[0]}))
+        return self.results
+
+    def save(self, directory="sweeps"):
+        # results.csv has one row per run, results.npz the final Q-tables and reward curves in the same order
+        os.makedirs(directory, exist_ok=True)
+        columns = list(self.configurations[0]) + ["total_reward", "wall_time"]
+        with open(os.path.join(directory, "results.csv"), "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.results)
+        np.savez_compressed(os.path.join(directory, "results.npz"),
+                            q_tables=np.stack([result["q_table"] for result in self.results]),
+                            **{f"reward_list_{i}": result["reward_list"] for i, result in enumerate(self.results)})
+        print(f"Results saved to {directory}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="train every alpha / gamma / epsilon schedule / seed combination")
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.1, 0.05])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[0.9, 0.95, 0.99])
+    parser.add_argument("--epsilon", type=float, nargs=3, action="append", metavar=("INITIAL", "DECAY", "MIN"),
+                        help="epsilon schedule, can be given several times")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--end-count", type=int, default=10000)
+    parser.add_argument("--engine", choices=["objects", "arrays"], default="arrays")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="sweeps")
+    args = parser.parse_args()
+
+    sweep = Sweep(args.alpha, args.gamma, args.epsilon or [(0.9, 0.999756, 0.1)], args.seeds, args.end_count,
+                  args.engine, args.workers)
+    sweep.run()
+    sweep.save(args.output)
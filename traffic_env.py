@@ -0,0 +1,92 @@
+from event_simulation import EventSimulation
+from simulation import Simulation
+
+
+class TrafficEnv:
+    def __init__(self, seed=None, engine="objects", max_decisions=10000, max_steps=None, clock=None):
+        # step/reset interface over a headless Simulation for agents that drive the intersection from outside
+        # an episode ends after max_decisions decisions or max_steps frames, whichever comes first
+        # the simulation and every buffer below are created once and reused by every episode
+        # engine="events" jumps from event to event with EventSimulation instead of stepping every frame
+        if engine == "events":
+            self.simulation = EventSimulation(seed=seed)
+        else:
+            self.simulation = Simulation(clock=clock, seed=seed, engine=engine)
+        self.engine = engine
+        self.max_decisions = max_decisions
+        self.max_steps = max_steps
+        self.directions = self.simulation.traffic_light_parameters["directions"]
+        self.number_of_actions = len(self.directions)
+
+        self.vehicle_count = None
+        self.old_vehicle_count = dict(self.simulation.vehicle_parameters["vehicle_count"])
+        self.old_dti = None
+        self.decisions = 0
+        self.steps = 0
+        self.done = False
+        self.info = {}
+
+    def reset(self, seed=None):
+        # starts a new episode (the same seed replays the same arrivals), returns the state of its first decision
+        simulation = self.simulation
+        simulation.reset(seed)
+        self.vehicle_count = simulation.vehicle_parameters["vehicle_count"]
+        self.old_vehicle_count.update(self.vehicle_count)
+        self.decisions = 0
+        self.steps = 0
+        self.done = False
+        self.advance()
+        self.old_dti = simulation.calculate_dti()
+        return simulation.encode_state(self.old_dti)
+
+    def should_take_action(self):
+        # same rule as Simulation.should_take_action: a lane above the vehicle threshold that grew this frame
+        threshold = self.simulation.vehicle_threshold
+        for direction, count in self.vehicle_count.items():
+            if count > threshold and count > self.old_vehicle_count[direction]:
+                return True
+        return False
+
+    def advance(self):
+        # runs the simulation until the next decision is due or the episode is over
+        if self.engine == "events":
+            frames = None if self.max_steps is None else self.max_steps - self.steps
+            decided = self.simulation.run(frames, until_decision=True)
+            self.steps = self.simulation.frame
+            self.old_vehicle_count.update(self.simulation.old_vehicle_count)
+            if not decided:
+                self.done = True
+            return
+        while True:
+            if self.max_steps is not None and self.steps >= self.max_steps:
+                self.done = True
+                return
+            self.old_vehicle_count.update(self.vehicle_count)
+            self.simulation.step()
+            self.steps += 1
+            if self.should_take_action():
+                return
+
+    def step(self, action):
+        # applies the action, runs to the next decision and returns (state, reward, done, info)
+        # the reward is the one Main.run calculates at that decision: the change in congestion since the last one
+        if self.done:
+            raise RuntimeError("Episode is over, call reset() first")
+        simulation = self.simulation
+        simulation.apply_action(action)
+        self.decisions += 1
+        self.advance()
+        if self.decisions >= self.max_decisions:
+            self.done = True
+
+        new_dti = simulation.calculate_dti()
+        reward = simulation.calculate_reward(self.old_dti, new_dti, self.old_vehicle_count, self.vehicle_count)
+        self.old_dti = new_dti
+
+        info = self.info
+        info["dti"] = new_dti
+        info["vehicle_count"] = self.vehicle_count
+        info["processed_vehicles"] = simulation.vehicle_parameters["processed_vehicles"]
+        info["time"] = simulation.clock.get_ticks()
+        info["steps"] = self.steps
+        return simulation.encode_state(new_dti), reward, self.done, info
@@ -1,11 +1,70 @@
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+import numpy as np
 import pygame
+from clock import WallClock
+from lanes import DIRECTIONS
+
+# what the lights show, the same object is handed out every frame until the lights change
+# colors maps every direction to the state of its light (what Vehicle.move reads), the arrays are the
+# (1, directions) go / red masks and the (1,) red or yellow flag VehicleStore.move_batch reads
+Phase = namedtuple("Phase", ["direction", "state", "colors", "go_condition", "light_is_red", "red_or_yellow"])
+
+
+@lru_cache(maxsize=None)
+def phase_snapshot(directions, direction, state):
+    # there are only len(directions) * 3 phases, each one is built once and shared by every intersection
+    colors = {d: "RED" for d in directions}
+    colors[direction] = state
+    go_condition = np.array([[direction == d and state == "GREEN" for d in DIRECTIONS]])
+    light_is_red = np.array([[colors.get(d, "GREEN") in ["RED", "YELLOW"] for d in DIRECTIONS]])
+    red_or_yellow = np.array([state in ["YELLOW", "RED"]])
+    for array in [go_condition, light_is_red, red_or_yellow]:
+        array.flags.writeable = False
+    return Phase(direction, state, MappingProxyType(colors), go_condition, light_is_red, red_or_yellow)
+
+
+class FixedTimings:
+    def __init__(self, timings):
+        # seconds every light state lasts, a state can also be given per direction ({"GREEN": {"north": 15, ...}})
+        # to split the green time between the directions
+        self.timings = timings
+
+    def duration(self, direction, state):
+        # milliseconds the lights stay in `state` when `direction` is the current light
+        seconds = self.timings[state]
+        if isinstance(seconds, dict):
+            seconds = seconds[direction]
+        return seconds * 1000
+
+    def extension(self, direction, green_time):
+        # milliseconds a green that reached its planned end is extended by, fixed timings never extend
+        return 0
+
+
+class ActuatedTimings(FixedTimings):
+    def __init__(self, timings, demand, max_green, extension=2):
+        # the planned green is the minimum green, it is extended by `extension` seconds as long as
+        # demand(direction) (e.g. the vehicles waiting in that lane) is not zero, up to max_green seconds
+        super().__init__(timings)
+        self.demand = demand
+        self.max_green = max_green
+        self.green_extension = extension
+
+    def extension(self, direction, green_time):
+        if self.demand(direction) > 0 and green_time + self.green_extension * 1000 <= self.max_green * 1000:
+            return self.green_extension * 1000
+        return 0
 
 
 class TrafficLights:
     def __init__(self, screen, current_traffic_light, current_light_state, traffic_lights_directions, trl_colors,
                  traffic_light_width, intersection_center, road_width, intersection_trl_width,
-                 traffic_light_change_times):
+                 traffic_light_change_times, clock=None):
         self.screen = screen
+        # the clock decides what "now" means, the wall clock keeps the old pygame.time.get_ticks behaviour
+        self.clock = clock if clock is not None else WallClock()
         self.current_traffic_light = current_traffic_light
         self.current_traffic_light_index = traffic_lights_directions.index(self.current_traffic_light)
         self.current_light_state = current_light_state
@@ -16,7 +75,13 @@ class TrafficLights:
         self.road_width = road_width
         self.intersection_trl_width = intersection_trl_width
         self.traffic_light_change_times = traffic_light_change_times
-        self.last_change_time = pygame.time.get_ticks()
+        # the timings dict of Simulation is a fixed plan, a FixedTimings or ActuatedTimings can be given instead
+        self.timing_plan = traffic_light_change_times if hasattr(traffic_light_change_times, "duration") \
+            else FixedTimings(traffic_light_change_times)
+        self.last_change_time = self.clock.get_ticks()
+        # the next change is scheduled when the lights change, every frame in between only compares the time
+        self.time_limit = self.timing_plan.duration(self.current_traffic_light, self.current_light_state)
+        self.phase = None
 
     def draw_traffic_light(self, direction, color):
         if direction == "north":
@@ -40,7 +105,7 @@ class TrafficLights:
                         self.intersection_center[1] - height // 2 + self.road_width // 4)
             size = (10, height)
 
-        pygame.draw.rect(self.screen, color, (*position, *size))
+        return pygame.draw.rect(self.screen, color, (*position, *size))
 
     def draw(self):
         light_color = self.trl_colors[self.current_light_state + "_TR"]
@@ -49,35 +114,45 @@ class TrafficLights:
         colors = {dr: self.trl_colors["RED_TR"] for dr in ["north", "south", "east", "west"]}
         colors[self.current_traffic_light] = light_color
 
-        # Drawing traffic lights for all directions
-        for direction, color in colors.items():
-            self.draw_traffic_light(direction, color)
+        # Drawing traffic lights for all directions, returns the areas that were drawn
+        return [self.draw_traffic_light(direction, color) for direction, color in colors.items()]
 
-    def update(self, current_time):
-        time_diff = current_time - self.last_change_time
-        time_limit = self.traffic_light_change_times[self.current_light_state] * 1000
-
-        if time_diff >= time_limit:
-            if self.current_light_state == "GREEN":
-                self.current_light_state = "YELLOW"
-            elif self.current_light_state == "YELLOW":
-                self.current_light_state = "RED"
-                # Move to next traffic light
-                self.current_traffic_light_index = (self.current_traffic_light_index + 1) % len(
-                    self.traffic_lights_directions)
-            elif self.current_light_state == "RED":
-                self.current_light_state = "GREEN"
-
-            self.last_change_time = current_time
+    @property
+    def next_change_time(self):
+        # when the current phase ends, unless the timing plan extends it or an action changes the light
+        return self.last_change_time + self.time_limit
 
+    def update(self, current_time):
+        # returns the Phase snapshot, a new one only when the lights change
+        if current_time - self.last_change_time >= self.time_limit:
+            self.change_phase(current_time)
+        elif self.phase is None:
+            self.publish()
+        return self.phase
+
+    def change_phase(self, current_time):
+        if self.current_light_state == "GREEN":
+            extension = self.timing_plan.extension(self.current_traffic_light, current_time - self.last_change_time)
+            if extension:
+                self.time_limit += extension
+                return
+            self.current_light_state = "YELLOW"
+        elif self.current_light_state == "YELLOW":
+            self.current_light_state = "RED"
+            # Move to next traffic light
+            self.current_traffic_light_index = (self.current_traffic_light_index + 1) % len(
+                self.traffic_lights_directions)
+        elif self.current_light_state == "RED":
+            self.current_light_state = "GREEN"
+
+        self.last_change_time = current_time
+        self.publish()
+
+    def publish(self):
         self.current_traffic_light = self.traffic_lights_directions[self.current_traffic_light_index]
-
-        current_traffic_light_colors = {direction: "RED" for direction in self.traffic_lights_directions}
-        current_traffic_light_colors[self.current_traffic_light] = self.current_light_state
-
-        # print(f"Traffic light color: {current_traffic_light_colors}")
-
-        return self.current_traffic_light, self.current_light_state, current_traffic_light_colors
+        self.time_limit = self.timing_plan.duration(self.current_traffic_light, self.current_light_state)
+        self.phase = phase_snapshot(tuple(self.traffic_lights_directions), self.current_traffic_light,
+                                    self.current_light_state)
 
     def change_light(self, direction):
         # Change the current traffic light to the specified direction
@@ -85,11 +160,15 @@ class TrafficLights:
             self.current_traffic_light = direction
             self.current_traffic_light_index = self.traffic_lights_directions.index(direction)
             self.current_light_state = "GREEN"  # Assuming you want to change it directly to green
-            self.last_change_time = pygame.time.get_ticks()
+            self.last_change_time = self.clock.get_ticks()
+            self.publish()
 
     # Inside the TrafficLights class:
     def reset(self):
         self.current_traffic_light = self.traffic_lights_directions[0]  # or whatever the initial light should be
         self.current_light_state = "RED"  # or your initial state
-        self.last_change_time = pygame.time.get_ticks()
+        self.last_change_time = self.clock.get_ticks()
+        self.time_limit = self.timing_plan.duration(self.current_traffic_light, self.current_light_state)
+        # the next update publishes the phase of current_traffic_light_index, like it always did
+        self.phase = None
         # Reset any other state variables here
@@ -1,70 +1,174 @@
 from main import Main
-import time
-import random
-from traffic_lights import TrafficLights
+from checkpoint import Checkpointer
+from metrics import MetricsLog
+from replay import EpisodeRecorder
+import argparse
 import os
 import numpy as np
 
 
 class Train:
-    def __init__(self, generations, end_count):
-        self.main_instance = Main()
+    def __init__(self, generations, end_count, headless=False, continuous=True, warm_start=False,
+                 q_table_filename='saved_models/sarsa_q_table.npy', checkpoint_filename=None,
+                 checkpoint_every=1000, checkpoint_seconds=None, resume=False, metrics_filename=None,
+                 profile_filename=None, profile_functions=False, record_directory=None):
+        # in continuous mode the agent keeps learning across generations, only the episode is reset
+        # otherwise every generation starts from an empty Q-table like before
+        # warm_start continues from the Q-table saved by an earlier training run
+        self.main_instance = Main(headless=headless)
         self.generations = generations
         self.end_count = end_count
+        self.continuous = continuous
+        self.q_table_filename = q_table_filename
         self.reward_dic = {}
+        # number of generations that are completely trained
+        self.completed_generations = 0
+
+        if warm_start:
+            self.load_model()
+
+        # the agent is checkpointed during training and after every generation,
+        # resuming continues with the first generation that did not complete
+        self.checkpointer = None
+        if checkpoint_filename is not None:
+            if resume and os.path.exists(checkpoint_filename):
+                self.load_checkpoint(checkpoint_filename)
+            self.checkpointer = Checkpointer(checkpoint_filename, self.checkpoint_state, checkpoint_every,
+                                             checkpoint_seconds)
+            self.main_instance.checkpointer = self.checkpointer
+
+        # per decision metrics are streamed to this file instead of being kept in memory
+        # a resumed run drops the records of the generation it runs again, a new run starts an empty log
+        if metrics_filename is not None:
+            self.main_instance.metrics = MetricsLog(
+                metrics_filename, completed_generations=self.completed_generations if resume else None)
+
+        # with a profile filename the phases of the loop are timed, a summary is printed after training and
+        # <profile_filename>.json (chrome://tracing) and <profile_filename>.pstats (profile_functions) are written
+        self.profile_filename = profile_filename
+
+        # every generation is recorded to <record_directory>/generation_<n>.npz for replay.py
+        self.record_directory = record_directory
+        if profile_filename is not None:
+            self.main_instance.simulation.profiler.enable(functions=profile_functions)
 
     def reset_environment(self):
-        self.main_instance.current_light_state = "RED"
-        self.main_instance.starting_traffic_light = random.choice(
-            self.main_instance.traffic_light_parameters["directions"])
-        self.main_instance.traffic_lights = TrafficLights(self.main_instance.screen,
-                                                          self.main_instance.starting_traffic_light,
-                                                          self.main_instance.current_light_state,
-                                                          self.main_instance.traffic_light_parameters["directions"],
-                                                          self.main_instance.colors["traffic_lights"],
-                                                          self.main_instance.traffic_light_width,
-                                                          self.main_instance.intersection_center,
-                                                          self.main_instance.road_width,
-                                                          self.main_instance.intersection_trl_width,
-                                                          self.main_instance.traffic_light_parameters["timings"])
-
-        # Clear all vehicles and reset related parameters
-        with self.main_instance.vehicle_list_lock:
-            self.main_instance.vehicle_list.clear()
-        self.main_instance.vehicle_parameters["vehicle_count"] = {"north": 0, "south": 0, "east": 0, "west": 0}
-        self.main_instance.vehicle_parameters["processed_vehicles"] = {"north": 0, "south": 0, "east": 0, "west": 0}
-        self.main_instance.vehicle_parameters["dti_info"] = {"north": {}, "south": {}, "east": {}, "west": {}}
+        # Clear all vehicles, counters and traffic lights
+        self.main_instance.simulation.reset()
 
         # Reset timers and counters
         self.main_instance.last_action_time = None
 
         # Reset reward and other metrics
-        self.main_instance.total_reward = 0
-
-        self.main_instance.initial_epsilon = 0.9
-
         self.main_instance.reward_list = []
+        self.main_instance.decision_count = 0
         self.main_instance.total_reward = 0
 
+    def load_model(self):
+        agent = self.main_instance.sarsa_agent
+        # older Q-tables have a row for every raw state, only the reachable rows are kept
+        agent.q_table = agent.state_indexer.compact(np.load(self.q_table_filename))
+        print("Model loaded successfully.")
+
     def save_model(self):
         # Ensure the directory for saving exists
-        os.makedirs('saved_models', exist_ok=True)
+        os.makedirs(os.path.dirname(self.q_table_filename) or ".", exist_ok=True)
         # Save the Q-table
-        np.save('saved_models/sarsa_q_table.npy', self.main_instance.sarsa_agent.q_table)
+        np.save(self.q_table_filename, self.main_instance.sarsa_agent.q_table)
         print("Model saved successfully.")
 
+    def checkpoint_state(self):
+        main = self.main_instance
+        simulation = main.simulation
+        return {
+            "q_table": main.sarsa_agent.q_table.copy(),
+            "epsilon": main.sarsa_agent.epsilon,
+            "generation": self.completed_generations,
+            "generation_rewards": np.array([self.reward_dic[g] for g in range(self.completed_generations)]),
+            "reward_list": np.array(main.reward_list),
+            "rng_state": Checkpointer.pack({"numpy": np.random.get_state(),
+                                            "simulation": simulation.random.getstate(),
+                                            "arrivals": simulation.arrival_process.rng.bit_generator.state}),
+        }
+
+    def load_checkpoint(self, filename):
+        # the checkpoint is saved between generations: the rewards of the generation that was running
+        # are not restored, reset_environment clears them when the next generation starts
+        checkpoint = Checkpointer.load(filename)
+        main = self.main_instance
+        main.sarsa_agent.q_table = checkpoint["q_table"]
+        main.sarsa_agent.epsilon = float(checkpoint["epsilon"])
+        self.completed_generations = int(checkpoint["generation"])
+        self.reward_dic = {g: reward for g, reward in enumerate(checkpoint["generation_rewards"].tolist())}
+        rng_state = Checkpointer.unpack(checkpoint["rng_state"])
+        np.random.set_state(rng_state["numpy"])
+        main.simulation.random.setstate(rng_state["simulation"])
+        main.simulation.arrival_process.rng.bit_generator.state = rng_state["arrivals"]
+        print(f"Resuming after generation {self.completed_generations}.")
+
     def train(self):
-        for generation in range(self.generations):
+        for generation in range(self.completed_generations, self.generations):
             self.reset_environment()
-            self.main_instance.initialize_sarsa()
+            if not self.continuous:
+                self.main_instance.initial_epsilon = 0.9
+                self.main_instance.initialize_sarsa()
+            recorder = None
+            if self.record_directory is not None:
+                recorder = EpisodeRecorder(generation + 1)
+                self.main_instance.recorder = recorder
+                self.main_instance.simulation.add_observer(recorder)
             total_reward = self.main_instance.run(generation + 1, True, self.end_count)
+            if recorder is not None:
+                self.main_instance.simulation.remove_observer(recorder)
+                recorder.save(os.path.join(self.record_directory, f"generation_{generation + 1}.npz"))
             self.reward_dic.setdefault(generation, total_reward)
-            time.sleep(1)
-            print(f"Generation: {generation + 1} | Reward: {total_reward}")
+            self.completed_generations = generation + 1
+            if self.main_instance.metrics is not None:
+                self.main_instance.metrics.flush()
+            if self.checkpointer is not None:
+                self.checkpointer.save()
+            print(f"Generation: {generation + 1} | Reward: {total_reward} | "
+                  f"Epsilon: {self.main_instance.sarsa_agent.epsilon:.3f}")
 
+        if self.checkpointer is not None:
+            self.checkpointer.close()
+        if self.main_instance.metrics is not None:
+            self.main_instance.metrics.close()
+        if self.profile_filename is not None:
+            self.save_profile()
         self.save_model()
 
+    def save_profile(self):
+        profiler = self.main_instance.simulation.profiler
+        profiler.disable()
+        print(profiler.summary())
+        os.makedirs(os.path.dirname(self.profile_filename) or ".", exist_ok=True)
+        profiler.dump_chrome_trace(f"{self.profile_filename}.json")
+        if profiler.function_profile is not None:
+            profiler.dump_pstats(f"{self.profile_filename}.pstats")
+
 
 if __name__ == "__main__":
-    train_model = Train(generations=50, end_count=10000)
+    parser = argparse.ArgumentParser(description="train the SARSA agent")
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--end-count", type=int, default=10000)
+    parser.add_argument("--warm-start", action="store_true", help="continue from saved_models/sarsa_q_table.npy")
+    parser.add_argument("--reset-agent", action="store_true", help="start every generation from an empty Q-table")
+    parser.add_argument("--render", action="store_true")
+    parser.add_argument("--checkpoint", default="saved_models/checkpoint.npz")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="decisions between checkpoints")
+    parser.add_argument("--checkpoint-seconds", type=float, default=None, help="seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint")
+    parser.add_argument("--metrics", default="saved_models/metrics.bin", help="per decision metrics log")
+    parser.add_argument("--profile", default=None, metavar="FILENAME", help="time the phases of the loop")
+    parser.add_argument("--profile-functions", action="store_true", help="also write a cProfile .pstats file")
+    parser.add_argument("--record", default=None, metavar="DIRECTORY", help="record every generation for replay.py")
+    args = parser.parse_args()
+
+    train_model = Train(generations=args.generations, end_count=args.end_count, headless=not args.render,
+                        continuous=not args.reset_agent, warm_start=args.warm_start,
+                        checkpoint_filename=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                        checkpoint_seconds=args.checkpoint_seconds, resume=args.resume,
+                        metrics_filename=args.metrics, profile_filename=args.profile,
+                        profile_functions=args.profile_functions, record_directory=args.record)
     train_model.train()
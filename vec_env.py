@@ -0,0 +1,159 @@
+import random
+import time
+import numpy as np
+from arrivals import ArrivalProcess
+from clock import SimulationClock
+from observation import LaneObservation
+from simulation import Simulation
+from state_indexer import StateIndexer
+from sarsa import BatchSARSA
+from traffic_lights import TrafficLights
+from vehicle_store import VehicleStore, DIRECTIONS
+
+
+class VecEnv:
+    def __init__(self, number_of_envs, seed=None):
+        # N independent intersections stepped in lockstep, all vehicles live in one VehicleStore
+        # the layout and parameters are the ones of the single intersection Simulation
+        self.number_of_envs = number_of_envs
+        self.layout = Simulation()
+        layout = self.layout
+        self.clock = SimulationClock()
+        self.vehicle_store = VehicleStore(layout.vehicle_parameters["radius"], layout.vehicle_parameters["width"],
+                                          layout.vehicle_parameters["speed"], layout.thresholds,
+                                          layout.vehicle_turning_points, layout.vehicle_spawn_coords,
+                                          layout.colors["vehicle_direction"], layout.width, layout.height,
+                                          self.clock, number_of_intersections=number_of_envs)
+        self.arrival_process = ArrivalProcess(layout.vehicle_parameters["arrival_rates"], seed=seed)
+        self.arrival_directions = np.array([DIRECTIONS.index(d) for d in self.arrival_process.directions])
+        self.random = random.Random(seed)
+        self.directions = layout.traffic_light_parameters["directions"]
+        # states and rewards of all intersections at once, ties in the state are broken
+        # in the key order of vehicle_parameters["dti_info"] like in Simulation
+        self.observation = LaneObservation(tuple(layout.vehicle_parameters["dti_info"]))
+
+        self.traffic_lights = []
+        self.vehicle_count = np.zeros((number_of_envs, len(DIRECTIONS)), dtype=np.int64)
+        self.old_vehicle_count = self.vehicle_count.copy()
+        self.processed_vehicles = self.vehicle_count.copy()
+        self.old_dti = np.zeros((number_of_envs, len(DIRECTIONS)))
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        self.clock.reset()
+        self.vehicle_store.clear()
+        if seed is not None:
+            self.random.seed(seed)
+            self.arrival_process.reset(seed)
+        self.traffic_lights = [
+            TrafficLights(None, self.random.choice(self.directions), "GREEN", self.directions,
+                          self.layout.colors["traffic_lights"], self.layout.traffic_light_width,
+                          self.layout.intersection_center, self.layout.road_width,
+                          self.layout.intersection_trl_width, self.layout.traffic_light_parameters["timings"],
+                          self.clock)
+            for _ in range(self.number_of_envs)]
+        self.vehicle_count[:] = 0
+        self.old_vehicle_count[:] = 0
+        self.processed_vehicles[:] = 0
+        self.old_dti[:] = 0
+
+    def step(self):
+        # one tick of every intersection, returns the indices of the intersections that want a decision
+        # (the same rule as Simulation.should_take_action: a lane above vehicle_threshold that is still growing)
+        self.old_vehicle_count[:] = self.vehicle_count
+        previous_time = self.clock.get_ticks()
+        self.clock.tick()
+        current_time = self.clock.get_ticks()
+
+        intersections, directions, turns = self.arrival_process.arrivals_batch(current_time - previous_time,
+                                                                                self.number_of_envs)
+        directions = self.arrival_directions[directions]
+        self.vehicle_store.spawn_batch(intersections, directions, turns)
+        np.add.at(self.vehicle_count, (intersections, directions), 1)
+
+        # the lights of every intersection hand out cached masks, stacking them is the only per env work
+        phases = [traffic_lights.update(current_time) for traffic_lights in self.traffic_lights]
+        go_condition = np.concatenate([phase.go_condition for phase in phases])
+        light_is_red = np.concatenate([phase.light_is_red for phase in phases])
+        red_or_yellow = np.concatenate([phase.red_or_yellow for phase in phases])
+
+        self.vehicle_store.move_batch(go_condition, light_is_red, red_or_yellow)
+        self.vehicle_store.kill_vehicles()
+        crossed = self.vehicle_store.crossed_threshold()
+        self.vehicle_count -= crossed
+        self.processed_vehicles += crossed
+
+        growing = (self.vehicle_count > self.old_vehicle_count) & (
+                self.vehicle_count > self.layout.vehicle_threshold)
+        return np.flatnonzero(growing.any(axis=1))
+
+    def calculate_dti(self):
+        return self.vehicle_store.calculate_dti()
+
+    def calculate_states(self, envs, dti):
+        return self.observation.states(dti[envs])
+
+    def collect_rewards(self, envs, dti):
+        # reward of every env in `envs` since its last decision, then remember the DTI of this decision
+        rewards = self.observation.rewards(self.old_dti[envs], dti[envs], self.old_vehicle_count[envs],
+                                           self.vehicle_count[envs]).astype(float)
+        self.old_dti[envs] = dti[envs]
+        return rewards
+
+    def apply_actions(self, envs, actions):
+        for env, action in zip(envs, actions):
+            self.traffic_lights[env].change_light(self.directions[action])
+
+
+class VecTrain:
+    def __init__(self, number_of_envs, end_count, seed=None, alpha=0.05, gamma=0.95, initial_epsilon=0.9,
+                 epsilon_decay=0.999756, min_epsilon=0.1):
+        # the training loop of Main.run applied to every intersection of a VecEnv at once,
+        # all intersections share one SARSA agent
+        self.env = VecEnv(number_of_envs, seed)
+        self.end_count = end_count
+        self.epsilon_decay = epsilon_decay
+        self.min_epsilon = min_epsilon
+        state_indexer = StateIndexer(self.env.directions)
+        self.sarsa_agent = BatchSARSA(alpha=alpha, gamma=gamma, epsilon=initial_epsilon,
+                                      number_of_states=state_indexer.number_of_states,
+                                      number_of_actions=len(self.env.directions),
+                                      state_indexer=state_indexer, seed=seed)
+        self.reward_list = []
+        self.total_reward = 0
+
+    def step(self):
+        envs = self.env.step()
+        if len(envs) == 0:
+            return 0
+
+        agent = self.sarsa_agent
+        # epsilon decays once per decision, as if the decisions were made one after the other
+        agent.epsilon = max(self.min_epsilon, agent.epsilon * self.epsilon_decay ** len(envs))
+
+        dti = self.env.calculate_dti()
+        current_states = self.env.calculate_states(envs, dti)
+        current_actions = agent.choose_action_batch(current_states)
+        self.env.apply_actions(envs, current_actions)
+
+        rewards = self.env.collect_rewards(envs, dti)
+        self.reward_list.extend(rewards.tolist())
+        self.total_reward += rewards.sum()
+
+        new_states = self.env.calculate_states(envs, dti)
+        next_actions = agent.choose_action_batch(new_states)
+        agent.update_batch(current_states, current_actions, rewards, new_states, next_actions)
+        return len(envs)
+
+    def train(self):
+        start = time.perf_counter()
+        while len(self.reward_list) <= self.end_count:
+            self.step()
+        elapsed = time.perf_counter() - start
+        print(f"Transitions: {len(self.reward_list)} | Reward: {self.total_reward} | "
+              f"Transitions per second: {len(self.reward_list) / elapsed:.0f}")
+        return self.total_reward
+
+
+if __name__ == "__main__":
+    VecTrain(number_of_envs=256, end_count=10000, seed=0).train()
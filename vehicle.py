@@ -1,10 +1,11 @@
 import pygame
+from clock import WallClock
 import random
 import uuid
 
 
 class Vehicle:
-    def __init__(self, screen, radius, width, speed, processed_vehicles, dti_info):
+    def __init__(self, screen, radius, width, speed, processed_vehicles, dti_info, clock=None):
         # initializing the variables
         self.screen, self.radius, self.width, self.speed = screen, radius, width, speed
         self.x, self.y, self.direction, self.color = None, None, None, None
@@ -12,21 +13,31 @@ class Vehicle:
         self.has_crossed_threshold, self.id = False, uuid.uuid4()
         self.processed_vehicles = processed_vehicles
         self.start_stop_time = None
+        # running delay time of each lane, shared by all vehicles
+        # this vehicle's own share is kept in wait so it can be taken out again in O(1) once it crosses
         self.dti_info = dti_info
+        self.wait = 0
         self.can_move = None
         self.stop_time = None
+        self.clock = clock if clock is not None else WallClock()
+        # neighbours in the lane queue (see LaneQueues) and the vehicle found in front during the last move
+        self.leader, self.follower, self.front = None, None, None
 
     def generate_vehicle(self, vehicle_spawn_coords, vehicle_incoming_direction, vehicle_direction_color,
-                         vehicle_count):
+                         vehicle_count, direction=None, out_going_direction=None):
         # setting the spawn direction of the vehicle
-        self.direction = random.choice(vehicle_incoming_direction)
+        # the direction and outgoing direction are picked at random unless an arrival process already chose them
+        self.direction = direction if direction is not None else random.choice(vehicle_incoming_direction)
         vehicle_count[self.direction] += 1
         self.lane = self.direction
         # using the vehicle spawn coordinates to spawn the vehicle according to the direction
         self.x, self.y = vehicle_spawn_coords[self.direction]
         # setting the color and outgoing direction of the vehicle
         # determines if the vehicle is going to turn left, right, or go straight
-        self.out_going_direction = random.choice(["straight", "left", "right"])
+        if out_going_direction is not None:
+            self.out_going_direction = out_going_direction
+        else:
+            self.out_going_direction = random.choice(["straight", "left", "right"])
         # depending on its outgoing direction, its color is set
         self.color = vehicle_direction_color[self.out_going_direction]
 
@@ -105,7 +116,29 @@ class Vehicle:
         else:
             return self.x
 
-    def move(self, vehicle_list, current_traffic_light, current_light_state, thresholds, vehicle_turning_points,
+    def find_vehicle_in_front(self):
+        # vehicles in a lane cannot overtake each other before the threshold,
+        # so the closest vehicle in front is the one spawned just before this one in the same lane
+        leader = self.leader
+        if leader is not None and leader.get_position() == self.get_position():
+            # vehicles at the same position are not in front,
+            # the leader was checked earlier in this frame so the vehicle it found in front is the one to use
+            leader = leader.front
+        self.front = leader
+        return leader
+
+    def is_blocked(self):
+        other_vehicle = self.find_vehicle_in_front()
+        if other_vehicle is None:
+            return False
+        distance = self.get_position() - other_vehicle.get_position()
+        if self.direction in ["west", "north"] and distance < 0 and abs(distance) < self.radius * 3:
+            return True
+        elif self.direction in ["east", "south"] and distance > 0 and abs(distance) < self.radius * 3:
+            return True
+        return False
+
+    def move(self, current_traffic_light, current_light_state, thresholds, vehicle_turning_points,
              current_traffic_light_colors):
 
         # defining a value for a vehicle to move
@@ -145,27 +178,20 @@ class Vehicle:
         # stopping the vehicle if there is another vehicle in front of it
         # both the vehicles should be in the same lane
         if light_state_for_direction in ["RED", "YELLOW"] and not self.has_crossed_threshold:
-            for other_vehicle in vehicle_list:
-                if other_vehicle.direction == self.direction and other_vehicle.id != self.id:
-                    distance = self.get_position() - other_vehicle.get_position()
-                    if self.direction in ["west", "north"] and distance < 0 and abs(distance) < self.radius * 3:
-                        self.can_move = False
-                        break
-                    elif self.direction in ["east", "south"] and distance > 0 and abs(distance) < self.radius * 3:
-                        self.can_move = False
-                        break
+            if self.is_blocked():
+                self.can_move = False
 
         # if the vehicle has stopped in the lane for which the lane's traffic light is yellow or red
         # its wait time is calculated
         # once the vehicle starts moving, its wait time is not calculated
-        # each vehicle in each lane's wait time is calculate and added to the dti_info dictionary
+        # each vehicle's wait time is added to its lane's total in the dti_info dictionary
         if not self.can_move:
             if self.stop_time is None:
-                self.stop_time = pygame.time.get_ticks()
-            if pygame.time.get_ticks() - self.stop_time >= 1000:
-                self.dti_info[self.direction].setdefault(self.id, 0)
-                self.dti_info[self.direction][self.id] += 1
-                self.stop_time = pygame.time.get_ticks()
+                self.stop_time = self.clock.get_ticks()
+            if self.clock.get_ticks() - self.stop_time >= 1000:
+                self.wait += 1
+                self.dti_info[self.direction] += 1
+                self.stop_time = self.clock.get_ticks()
             return
         else:
             self.stop_time = None
@@ -205,7 +231,8 @@ class Vehicle:
         return self.x, self.y
 
     def draw(self):
-        pygame.draw.circle(self.screen, self.color, [self.x, self.y], self.radius, self.width)
+        # returns the area that was drawn
+        return pygame.draw.circle(self.screen, self.color, [self.x, self.y], self.radius, self.width)
 
     # once the vehicle is off the screen
     # it is removed from the vehicle thread list
@@ -232,13 +259,13 @@ class Vehicle:
             # once the vehicle has crossed the threshold
             # it is removed from the vehicle thread list
             # this removed vehicle's delay time is no longer required to calculate the delay time indicator
-            # hence its wait time is removed from the dti_info dictionary
+            # hence its wait time is subtracted from its lane's total in the dti_info dictionary
             if crossed:
                 self.has_crossed_threshold = True
                 self.processed_vehicles[self.direction] += 1
                 # delete the delay of a vehicle if it has crossed the threshold
-                if self.id in self.dti_info[self.direction]:
-                    del self.dti_info[self.direction][self.id]
+                self.dti_info[self.direction] -= self.wait
+                self.wait = 0
                 return True, self.direction
 
         return False, None
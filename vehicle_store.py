@@ -0,0 +1,215 @@
+import pygame
+import numpy as np
+from lanes import DIRECTIONS, TURNS
+
+
+class VehicleStore:
+    def __init__(self, radius, width, speed, thresholds, vehicle_turning_points, vehicle_spawn_coords,
+                 vehicle_direction_color, screen_width, screen_height, clock, capacity=1024,
+                 number_of_intersections=1):
+        # structure of arrays version of Vehicle: vehicle i lives at index i of every array
+        # vehicles are kept in spawn order, which is also their order along each lane
+        # several independent intersections with the same layout can share one store,
+        # a lane is then identified by (intersection, direction)
+        self.radius, self.width, self.speed = radius, width, speed
+        self.screen_width, self.screen_height = screen_width, screen_height
+        self.clock = clock
+        self.colors = [vehicle_direction_color[turn] for turn in TURNS]
+        self.number_of_intersections = number_of_intersections
+        self.number_of_lanes = number_of_intersections * len(DIRECTIONS)
+
+        # per direction constants (indexed like DIRECTIONS)
+        # axis 0 is x and axis 1 is y, sign is +1 when the vehicle drives towards larger coordinates
+        self.axis = np.array([1, 0, 1, 0])
+        self.sign = np.array([1, -1, -1, 1])
+        self.thresholds = np.array([thresholds[direction] for direction in DIRECTIONS], dtype=float)
+        self.spawn_coords = np.array([vehicle_spawn_coords[direction] for direction in DIRECTIONS], dtype=float)
+
+        # turning point and the direction of travel on the other axis once it is reached (indexed by [direction, turn])
+        # going straight never reaches a turning point, so its entry is unused
+        self.turning_points = np.zeros((len(DIRECTIONS), len(TURNS)))
+        for t, turn in enumerate(TURNS[1:], start=1):
+            for d, direction in enumerate(DIRECTIONS):
+                self.turning_points[d, t] = vehicle_turning_points[turn][direction]
+        self.turn_sign = np.array([
+            # straight, left, right
+            [0, 1, -1],  # north
+            [0, 1, -1],  # east
+            [0, -1, 1],  # south
+            [0, -1, 1],  # west
+        ])
+
+        self.count = 0
+        self.capacity = capacity
+        self.position = np.zeros((capacity, 2))
+        self.intersection = np.zeros(capacity, dtype=np.int64)
+        self.direction = np.zeros(capacity, dtype=np.int64)
+        self.turn = np.zeros(capacity, dtype=np.int64)
+        self.crossed = np.zeros(capacity, dtype=bool)
+        self.stop_time = np.full(capacity, np.nan)
+        self.wait = np.zeros(capacity, dtype=np.int64)
+        self.fields = ["position", "intersection", "direction", "turn", "crossed", "stop_time", "wait"]
+        # running total of the wait in each (intersection, direction), updated when a vehicle waits or crosses
+        self.dti = np.zeros((number_of_intersections, len(DIRECTIONS)), dtype=np.int64)
+
+        # separates the lanes when every vehicle is searched in one sorted array
+        self.lane_offset = 10 * (screen_width + screen_height)
+
+    def clear(self):
+        self.count = 0
+        self.dti[:] = 0
+
+    def grow(self, required):
+        # double the preallocated arrays until `required` vehicles fit
+        while self.capacity < required:
+            self.capacity *= 2
+        for name in self.fields:
+            old = getattr(self, name)
+            new = np.empty((self.capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def spawn(self, direction, out_going_direction, intersection=0):
+        self.spawn_batch(np.array([intersection]), np.array([DIRECTIONS.index(direction)]),
+                         np.array([TURNS.index(out_going_direction)]))
+
+    def spawn_batch(self, intersections, directions, turns):
+        # directions and turns are indices into DIRECTIONS and TURNS, vehicles are added in the given order
+        added = len(directions)
+        if added == 0:
+            return
+        if self.count + added > self.capacity:
+            self.grow(self.count + added)
+        new = slice(self.count, self.count + added)
+        self.position[new] = self.spawn_coords[directions]
+        self.intersection[new] = intersections
+        self.direction[new] = directions
+        self.turn[new] = turns
+        self.crossed[new] = False
+        self.stop_time[new] = np.nan
+        self.wait[new] = 0
+        self.count += added
+
+    def lanes(self):
+        n = self.count
+        return self.intersection[:n] * len(DIRECTIONS) + self.direction[:n]
+
+    def find_blocked(self, ahead, new_ahead, limit, need_check, lane, lane_start):
+        # all arrays are sorted by lane, and by spawn order within a lane
+        # a vehicle is blocked when a vehicle spawned before it in the same lane is in front of it
+        # and less than 3 radii away, checked against the positions those vehicles already moved to this frame
+        # `ahead` is the distance driven along the lane, it never increases from one vehicle to the next in spawn
+        # order once it is capped at `limit` (beyond it a vehicle is too far to block a vehicle before the threshold)
+        # so the closest vehicle in front can be found with a binary search per lane
+        clipped = np.minimum(new_ahead, limit)
+        keys = lane * self.lane_offset - clipped
+        first_not_in_front = np.searchsorted(keys, lane * self.lane_offset - ahead, side="left")
+        lead = np.minimum(first_not_in_front, np.arange(len(keys))) - 1
+        has_lead = lead >= lane_start[lane]
+        gap = clipped[lead] - ahead
+        return need_check & has_lead & (gap > 0) & (gap < self.radius * 3)
+
+    def move_batch(self, go_condition, light_is_red, red_or_yellow):
+        # vectorized Vehicle.move for every vehicle of every intersection at once
+        # go_condition and light_is_red are (intersections, directions) arrays,
+        # red_or_yellow tells whether the current light of each intersection is red or yellow
+        n = self.count
+        if n == 0:
+            return
+        rows = np.arange(n)
+        intersection = self.intersection[:n]
+        direction = self.direction[:n]
+        turn = self.turn[:n]
+        crossed = self.crossed[:n]
+        axis = self.axis[direction]
+        sign = self.sign[direction]
+        position = self.position[rows, axis]
+
+        past_threshold = sign * (position - self.thresholds[direction]) > 0
+        keep_moving_condition = past_threshold & red_or_yellow[intersection]
+
+        # same decisions as Vehicle.move and Vehicle.handle_turn
+        turning = go_condition[intersection, direction] | (crossed & ~keep_moving_condition)
+        approaching = ~turning & ~crossed & (sign * (position - self.thresholds[direction]) < 0)
+        before_turning_point = (turn == 0) | (sign * (position - self.turning_points[direction, turn]) < 0)
+        along_lane = approaching | (turning & before_turning_point)
+        across_lane = turning & ~before_turning_point
+
+        # resolve which vehicles are blocked by the vehicle in front of them
+        # repeated until nothing changes, because a vehicle moving can free or block the one behind it
+        # starting from every vehicle that has to check being stopped, which is already right for standing queues
+        need_check = light_is_red[intersection, direction] & ~crossed
+        lane = intersection * len(DIRECTIONS) + direction
+        order = np.argsort(lane, kind="stable")
+        sorted_lane = lane[order]
+        lane_start = np.searchsorted(sorted_lane, np.arange(self.number_of_lanes))
+        sorted_ahead = (sign * position)[order]
+        sorted_limit = (sign * self.thresholds[direction] + self.radius * 3)[order]
+        sorted_need_check = need_check[order]
+        sorted_step = self.speed * along_lane[order]
+        sorted_blocked = sorted_need_check.copy()
+        while True:
+            new_ahead = sorted_ahead + sorted_step * ~sorted_blocked
+            now_blocked = self.find_blocked(sorted_ahead, new_ahead, sorted_limit, sorted_need_check, sorted_lane,
+                                            lane_start)
+            if np.array_equal(now_blocked, sorted_blocked):
+                break
+            sorted_blocked = now_blocked
+        blocked = np.empty(n, dtype=bool)
+        blocked[order] = sorted_blocked
+        new_position = position + sign * self.speed * (along_lane & ~blocked)
+
+        # wait time of stopped vehicles, one unit of delay for every second spent behind another vehicle
+        now = self.clock.get_ticks()
+        stop_time = self.stop_time[:n]
+        stop_time[blocked & np.isnan(stop_time)] = now
+        delayed = blocked & (now - stop_time >= 1000)
+        self.wait[:n][delayed] += 1
+        self.dti += np.bincount(lane[delayed], minlength=self.number_of_lanes).reshape(self.dti.shape)
+        stop_time[delayed] = now
+        stop_time[~blocked] = np.nan
+
+        self.position[rows, axis] = new_position
+        across = across_lane & ~blocked
+        self.position[rows[across], 1 - axis[across]] += self.turn_sign[direction[across], turn[across]] * self.speed
+
+    def crossed_threshold(self):
+        # marks the vehicles that crossed their threshold,
+        # returns how many crossed in each (intersection, direction)
+        n = self.count
+        direction = self.direction[:n]
+        position = self.position[np.arange(n), self.axis[direction]]
+        newly_crossed = ~self.crossed[:n] & (self.sign[direction] * (position - self.thresholds[direction]) > 0)
+        self.crossed[:n] |= newly_crossed
+        # the wait time of a vehicle is no longer part of the delay time indicator once it crossed
+        lanes = self.lanes()[newly_crossed]
+        waited = np.bincount(lanes, weights=self.wait[:n][newly_crossed], minlength=self.number_of_lanes)
+        self.dti -= waited.astype(np.int64).reshape(self.dti.shape)
+        self.wait[:n][newly_crossed] = 0
+        crossed = np.bincount(lanes, minlength=self.number_of_lanes)
+        return crossed.reshape(self.number_of_intersections, len(DIRECTIONS))
+
+    def kill_vehicles(self):
+        # remove the vehicles that are off the screen, keeping the others in spawn order
+        # returns the positions of the removed vehicles
+        n = self.count
+        x, y = self.position[:n, 0], self.position[:n, 1]
+        keep = ~((x < 0) | (x > self.screen_width) | (y < 0) | (y > self.screen_height))
+        if keep.all():
+            return np.zeros((0, 2))
+        removed = self.position[:n][~keep]
+        kept = int(keep.sum())
+        for name in self.fields:
+            array = getattr(self, name)
+            array[:kept] = array[:n][keep]
+        self.count = kept
+        return removed
+
+    def calculate_dti(self):
+        # total wait time in each (intersection, direction)
+        return self.dti.copy()
+
+    def draw(self, screen, intersection=0):
+        # returns the areas that were drawn
+        return [pygame.draw.circle(screen, self.colors[self.turn[i]], list(self.position[i]), self.radius, self.width)
+                for i in np.flatnonzero(self.intersection[:self.count] == intersection)]